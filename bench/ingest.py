@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""ingest.py
+
+Benchmarks the ingest pipeline on synthetic seasons (see ``synth.py``). Each
+stage is timed on its own:
+
+    validate: ``validate.validate`` (per-file checks and misspelled names).
+    parse:    ``generate.build_rows`` (reading, validating, parsing and
+              resolving competitors), collected into a list.
+    load:     ``generate.write_batches`` of the parsed rows into fresh tables.
+    summary:  ``generate.insert_summary``.
+    stats:    ``generate.insert_stats``.
+    index:    ``create_indexes.sql``, which runs after the data is in.
+
+The database stages run against ``--database``, which defaults to an
+in-memory SQLite database (``sqlite://``), inside a transaction that's
+rolled back. They drop and recreate every table, so ``--database`` should be
+a scratch database (e.g., a local PostgreSQL server); $DATABASE_URL, which is
+what ``generate.py`` builds, is refused.
+
+Every run is appended to ``bench/history.jsonl`` and compared with the last
+run at the same scale and seed.
+
+Example:
+    From the root of the repository ::
+
+        $ python bench/ingest.py --scale 10
+        Wrote 157 files (6186 runs) to /tmp/...
+        validate     0.812s
+        ...
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'data'))
+
+import generate  # noqa: E402
+import validate  # noqa: E402
+from database import connect  # noqa: E402
+from roster import Roster  # noqa: E402
+from synth import synthesize  # noqa: E402
+
+HISTORY = ROOT / 'bench' / 'history.jsonl'
+STAGES = ['validate', 'parse', 'load', 'summary', 'stats', 'index']
+
+
+def timed(func, *args):
+    """Call `func(*args)`, discarding anything it prints.
+
+    Returns:
+        (float, object): (seconds taken, `func`'s return value).
+    """
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            value = func(*args)
+            return time.perf_counter() - start, value
+
+
+def reset_tables(db):
+    """Drop and recreate every table.
+    """
+    db.query_file('drop_tables.sql')
+    db.query_file('create_tables.sql')
+
+
+def parse(files, meta, jobs):
+    """Run every file through `generate.build_rows`.
+    """
+    return list(generate.build_rows(files, Roster(meta), jobs=jobs))
+
+
+def load(db, rows):
+    """Insert the rows built by `generate.build_rows` into fresh tables.
+    """
+    reset_tables(db)
+    generate.write_batches(db, rows)
+
+
+def run_stages(files, jobs, repeat, url=None):
+    """Time each stage on `files`, keeping the best of `repeat` runs.
+
+    Args:
+        url (str): The database to time the database stages against (see
+                   `database.connect`). They're skipped if it's None.
+
+    Returns:
+        Dict[str, float]: Seconds per stage (None for skipped stages).
+    """
+    paths = [str(f) for f in files]
+    with generate.META_DATA.open() as meta:
+        meta = json.load(meta)
+
+    timings = dict.fromkeys(STAGES)
+    for _ in range(repeat):
+        results = [
+            ('validate', timed(validate.validate, paths, jobs)),
+            ('parse', timed(parse, files, meta, jobs)),
+        ]
+        report = results[0][1][1]
+        if report['errors']:
+            raise ValueError('{0} errors in the synthetic files'.format(
+                report['errors']))
+
+        if url:
+            db = connect(url)
+            try:
+                rows = results[1][1][1]
+                results.append(('load', timed(load, db, rows)))
+                results.append(
+                    ('summary', timed(generate.insert_summary, db)))
+                results.append(('stats', timed(generate.insert_stats, db)))
+                results.append(('index', timed(
+                    db.query_file, 'create_indexes.sql')))
+            finally:
+                db.rollback()
+                db.close()
+
+        for stage, (seconds, _) in results:
+            if timings[stage] is None or seconds < timings[stage]:
+                timings[stage] = seconds
+    return timings
+
+
+def git_commit():
+    """Get the checked-out commit (or None outside of a git repository).
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=str(ROOT),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous(history, record):
+    """Find the last run in `history` with the same scale, seed and kind of
+    database as `record`.
+    """
+    if not history.exists():
+        return None
+    last = None
+    with history.open() as f:
+        for line in f:
+            entry = json.loads(line)
+            # Runs from before SQLite was supported used PostgreSQL.
+            if (entry['scale'], entry['seed'],
+                    entry.get('database', 'postgresql')) == (
+                        record['scale'], record['seed'], record['database']):
+                last = entry
+    return last
+
+
+def format_timings(record, last=None):
+    """Format a run's timings, with the change since `last` if given.
+    """
+    lines = []
+    for stage in STAGES:
+        seconds = record['timings'][stage]
+        if seconds is None:
+            lines.append('{0:<10} skipped'.format(stage))
+            continue
+        line = '{0:<10} {1:8.3f}s'.format(stage, seconds)
+        before = last and last['timings'].get(stage)
+        if before:
+            line += '  ({0:+.1%} vs. {1})'.format(seconds / before - 1,
+                                                 last['commit'])
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the ingest pipeline on synthetic seasons.')
+    parser.add_argument(
+        '--scale',
+        type=int,
+        default=1,
+        help='the number of synthetic seasons (season 7 is one)')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='the random number seed')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=1,
+        help='the number of runs to take the best time of')
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='the number of validation and parsing worker processes')
+    parser.add_argument(
+        '--history',
+        type=pathlib.Path,
+        default=HISTORY,
+        help='the JSON lines file to append the results to')
+    parser.add_argument(
+        '--database',
+        default='sqlite://',
+        help=('the URL of a scratch database to time the database stages '
+              'against (default: %(default)s)'))
+    args = parser.parse_args()
+    if args.database == os.environ.get('DATABASE_URL'):
+        parser.error('--database is dropped and recreated, so it can\'t be '
+                     '$DATABASE_URL')
+
+    os.chdir(str(ROOT))  # The pipeline uses paths relative to the root.
+    with tempfile.TemporaryDirectory() as root:
+        files, runs = synthesize(pathlib.Path(root), args.scale, args.seed)
+        print('Wrote {0} files ({1} runs) to {2}.'.format(
+            len(files), runs, root))
+        timings = run_stages(files, args.jobs, args.repeat,
+                             args.database)
+
+    record = {
+        'date': datetime.datetime.utcnow().isoformat() + 'Z',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'scale': args.scale,
+        'seed': args.seed,
+        'files': len(files),
+        'runs': runs,
+        'jobs': args.jobs,
+        'database': args.database and args.database.split(':')[0],
+        'repeat': args.repeat,
+        'timings': timings
+    }
+    print(format_timings(record, previous(args.history, record)))
+    with args.history.open('a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
@@ -0,0 +1,269 @@
+"""synth.py
+
+Writes synthetic seasons of course CSV files for benchmarking. The files use
+the same layout as ``data/csv`` (Name, Age, Gender, obstacle/Transition
+pairs, Total and Result, with (NS) and (PS) runs) and pass ``validate.py``.
+
+Each season follows the real format: six city qualifiers, whose top
+`ADVANCE['Qualifying']` competitors run the city finals, whose top
+`ADVANCE['Finals']` competitors run Stage 1 in Las Vegas, which anyone who
+completes a stage moves on from. The sizes and completion rates are modelled
+on season 7, so a scale of N produces roughly N times its rows.
+
+Example:
+    From the root of the repository ::
+
+        $ python bench/synth.py /tmp/synth --seasons 10
+        Wrote 157 files (6186 runs) to /tmp/synth.
+"""
+import argparse
+import csv
+import pathlib
+import random
+
+CITIES = [
+    'Atlanta', 'Dallas', 'Denver', 'Houston', 'Indianapolis', 'Kansas City',
+    'Los Angeles', 'Miami', 'Oklahoma City', 'Orlando', 'Philadelphia',
+    'Pittsburgh', 'San Antonio', 'San Pedro', 'Venice'
+]
+# (Directory, category, obstacles, per-obstacle success rate) for each
+# course, in the order they're run.
+COURSES = [
+    ('1', 'Qualifying', 6, 0.85),
+    ('2', 'Finals', 10, 0.77),
+    ('3', 'Stage-1', 8, 0.88),
+    ('3', 'Stage-2', 6, 0.7),
+    ('3', 'Stage-3', 8, 0.7),
+    ('3', 'Stage-4', 1, 0.5),
+]
+# The number of competitors per city qualifier.
+ENTRANTS = 50
+# The number of competitors from each city that move on from its qualifier
+# and finals.
+ADVANCE = {'Qualifying': 30, 'Finals': 15}
+# The share of last season's competitors who come back.
+RETURNING = 0.7
+# The share of runs that aren't shown (NS) or are partially shown (PS) on
+# the city courses and Stages 1 and 2.
+NOT_SHOWN = 0.6
+PARTIALLY_SHOWN = 0.03
+
+FIRST_NAMES = [
+    ('M', 'Adam'), ('M', 'Brian'), ('M', 'Chris'), ('M', 'Daniel'),
+    ('M', 'Drew'), ('M', 'Eric'), ('M', 'Grant'), ('M', 'Isaac'),
+    ('M', 'James'), ('M', 'Josh'), ('M', 'Kevin'), ('M', 'Lance'),
+    ('M', 'Mike'), ('M', 'Nate'), ('M', 'Ryan'), ('M', 'Sean'),
+    ('M', 'Tyler'), ('M', 'Zach'), ('F', 'Allyssa'), ('F', 'Anna'),
+    ('F', 'Barclay'), ('F', 'Casey'), ('F', 'Erin'), ('F', 'Jessie'),
+    ('F', 'Kacy'), ('F', 'Meagan'), ('F', 'Michelle'), ('F', 'Natalie')
+]
+ONSETS = 'B C D F G H J K L M N P R S T W Br Ch Gr St'.split()
+NUCLEI = 'a e i o u ar el or'.split()
+CODAS = 'ton son ley man ford wood ski ell ock berg'.split()
+ADJECTIVES = [
+    'Broken', 'Cannonball', 'Crazy', 'Double', 'Floating', 'Flying',
+    'Hanging', 'Jumping', 'Rolling', 'Spinning', 'Swinging',
+    'Tilting', 'Triple', 'Ultimate', 'Warped'
+]
+NOUNS = [
+    'Bridge', 'Cliffhanger', 'Dice', 'Doors', 'Drop', 'Grip', 'Ladder',
+    'Ledge', 'Log', 'Rings', 'Slider', 'Steps', 'Swing', 'Wall', 'Wheel'
+]
+
+
+class Competitor(object):
+    """A synthetic competitor, who keeps their name, sex and ability from one
+    season to the next.
+    """
+
+    def __init__(self, name, sex, born, skill, pace):
+        self.name = name
+        self.sex = sex
+        self.born = born
+        self.skill = skill
+        self.pace = pace
+
+
+def new_competitor(rng, taken, season):
+    """Create a competitor whose name isn't in `taken` (and add it).
+    """
+    while True:
+        sex, first = rng.choice(FIRST_NAMES)
+        last = (rng.choice(ONSETS) + rng.choice(NUCLEI) +
+                rng.choice(ONSETS).lower() + rng.choice(NUCLEI) +
+                rng.choice(CODAS))
+        name = '{0} {1}'.format(first, last)
+        if name not in taken:
+            taken.add(name)
+            return Competitor(name, sex, season - rng.randint(19, 45),
+                              rng.gauss(0, 0.05), rng.uniform(0.7, 1.4))
+
+
+def obstacles(rng, size):
+    """Pick `size` distinct obstacle titles.
+    """
+    titles = set()
+    while len(titles) < size:
+        titles.add('{0} {1}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS)))
+    titles = sorted(titles)
+    rng.shuffle(titles)
+    return titles
+
+
+def run(rng, competitor, size, rate):
+    """Simulate a run.
+
+    Returns:
+        (List[float], List[float]): (obstacle splits, transitions), where
+                                    transition k follows obstacle k and a run
+                                    that's short of `size` failed the next
+                                    obstacle.
+    """
+    splits = []
+    transitions = []
+    rate = min(0.99, max(0.05, rate + competitor.skill))
+    while len(splits) < size and rng.random() < rate:
+        splits.append(round(rng.uniform(1, 25) * competitor.pace, 2))
+        if len(splits) < size:
+            transitions.append(round(rng.uniform(0, 30) * competitor.pace, 2))
+    return splits, transitions
+
+
+def course_rows(rng, field, size, rate, season, hidden):
+    """Simulate a course's runs.
+
+    Args:
+        field (List[Competitor]): The competitors, in running order.
+        hidden (bool): True if some runs aren't shown.
+
+    Returns:
+        (List[List[str]], List[Competitor], List[Competitor]): (CSV rows, the
+            competitors ranked from furthest and fastest to slowest, the
+            competitors who completed the course).
+    """
+    rows = []
+    ranked = []
+    finishers = []
+    for competitor in field:
+        splits, transitions = run(rng, competitor, size, rate)
+        cells = [''] * (2 * size - 1)
+        cells[0:len(cells):2] = [str(s) for s in splits] + [''] * (
+            size - len(splits))
+        cells[1:len(cells):2] = [str(t) for t in transitions] + [''] * (
+            size - 1 - len(transitions))
+        total = 0
+        for value in cells:
+            if value:
+                total += float(value)
+        total = str(round(total, 2)) if splits else ''
+        done = len(splits) == size
+        ranked.append((-len(splits), float(total or 'inf'), competitor))
+        if done:
+            finishers.append(competitor)
+
+        name = competitor.name
+        age = str(season - competitor.born)
+        draw = rng.random()
+        if hidden and draw < NOT_SHOWN:
+            # Only the failure point (or the total time, if they finished)
+            # is known.
+            name += ' (NS)'
+            age = '' if draw < NOT_SHOWN / 4 else age
+            cells = [''] * len(cells)
+            if not done:
+                cells[2 * len(splits)] = 'F'
+                total = ''
+        elif hidden and draw < NOT_SHOWN + PARTIALLY_SHOWN and len(
+                splits) > 1:
+            # The first obstacles (and their transitions) weren't shown.
+            name += ' (PS)'
+            cut = 2 * rng.randint(1, len(splits) - 1)
+            cells[:cut] = [''] * cut
+        rows.append([name, age, competitor.sex] + cells +
+                    [total, 'Completed' if done else 'Failed'])
+
+    ranked.sort(key=lambda r: r[:2])
+    return rows, [r[2] for r in ranked], finishers
+
+
+def write_course(path, titles, rows):
+    """Write a course CSV file.
+    """
+    headings = ['Name', 'Age', 'Gender']
+    for i, title in enumerate(titles):
+        if i:
+            headings.append('Transition {0}'.format(i))
+        headings.append(title)
+    headings.extend(['Total', 'Result'])
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(headings)
+        writer.writerows(rows)
+
+
+def synthesize(root, seasons, seed=0):
+    """Write `seasons` synthetic seasons of course CSV files under `root`.
+
+    Args:
+        root (pathlib.Path): The directory to write ``season<N>`` directories
+                             to.
+        seed (int): The seed for the random number generator; the same seed
+                    always produces the same files.
+
+    Returns:
+        (List[pathlib.Path], int): (the files written, the number of runs).
+    """
+    rng = random.Random(seed)
+    taken = set()
+    pool = []
+    files = []
+    runs = 0
+    for season in range(1, seasons + 1):
+        pool = rng.sample(pool, int(len(pool) * RETURNING))
+        while len(pool) < ENTRANTS * 6:
+            pool.append(new_competitor(rng, taken, season))
+        rng.shuffle(pool)
+
+        vegas = []
+        for i, city in enumerate(sorted(rng.sample(CITIES, 6))):
+            field = pool[i * ENTRANTS:(i + 1) * ENTRANTS]
+            for directory, category, size, rate in COURSES[:2]:
+                rows, ranked, _ = course_rows(rng, field, size, rate,
+                                              season, True)
+                path = root / 'season{0}'.format(season) / directory / (
+                    '{0}-{1}-{2}.csv'.format(city, category, season))
+                write_course(path, obstacles(rng, size), rows)
+                files.append(path)
+                runs += len(rows)
+                field = ranked[:ADVANCE[category]]
+            vegas.extend(field)
+
+        field = vegas
+        for directory, category, size, rate in COURSES[2:]:
+            if not field:
+                break
+            rows, _, field = course_rows(rng, field, size, rate, season,
+                                         category in ('Stage-1', 'Stage-2'))
+            path = root / 'season{0}'.format(season) / directory / (
+                '{0}-{1}.csv'.format(category, season))
+            write_course(path, obstacles(rng, size), rows)
+            files.append(path)
+            runs += len(rows)
+    return files, runs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Write synthetic seasons of course CSV files.')
+    parser.add_argument('root', type=pathlib.Path, help='the output directory')
+    parser.add_argument(
+        '--seasons', type=int, default=1, help='the number of seasons')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='the random number seed')
+    args = parser.parse_args()
+
+    files, runs = synthesize(args.root, args.seasons, args.seed)
+    print('Wrote {0} files ({1} runs) to {2}.'.format(
+        len(files), runs, args.root))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""bundle.py
+
+Exports the database's tables to a directory of NumPy ``.npy`` files (one
+per column) that can be memory-mapped, so the whole dataset loads in
+milliseconds without a database connection.
+
+The layout is described by ``manifest.json``, which is written last:
+
+    {
+        "version": 1,
+        "tables": {
+            "Ninja": {
+                "rows": 314,
+                "columns": {
+                    "ninja_id": {"dtype": "int32",
+                                 "file": "Ninja.ninja_id.npy"},
+                    "first_name": {"dtype": "text",
+                                   "file": "Ninja.first_name.npy",
+                                   "levels": "Ninja.first_name.levels.npy"},
+                    ...
+
+Each column is stored with the type given in `SCHEMA`. Text columns are
+dictionary-encoded: ``<file>`` holds int32 codes into the sorted unique
+values in ``<levels>``. Missing values are -1 in text and integer columns
+and NaN in float columns. Times are float32, which is accurate to well
+under a hundredth of a second; the scores in CareerSummary are float64.
+
+Example:
+    From the root of the repository ::
+
+        $ python data/bundle.py build/bundle --database sqlite:///ninjas.db
+
+    and then, with ``data`` on the path ::
+
+        b = bundle.load('build/bundle')
+        titles = b.text('Obstacle', 'title')
+        splits = b.column('ObstacleResult', 'duration')
+"""
+import argparse
+import collections
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from database import connect
+from dataset import codes
+from stats import to_float
+
+VERSION = 1
+MANIFEST = 'manifest.json'
+# The exported columns of each table (in the order they're sorted by) and
+# their types: a NumPy dtype or "text".
+SCHEMA = collections.OrderedDict([
+    ('Ninja', [('ninja_id', 'int32'), ('first_name', 'text'),
+               ('last_name', 'text'), ('sex', 'text'), ('age', 'int32'),
+               ('occupation', 'text'), ('instagram', 'text'),
+               ('twitter', 'text')]),
+    ('Course', [('course_id', 'int32'), ('city', 'text'),
+                ('category', 'text'), ('season', 'int32'),
+                ('size', 'int32')]),
+    ('Obstacle', [('obstacle_id', 'int32'), ('title', 'text'),
+                  ('course_id', 'int32')]),
+    ('ObstacleResult', [('result_id', 'int32'), ('obstacle_id', 'int32'),
+                        ('ninja_id', 'int32'), ('duration', 'float32'),
+                        ('transition', 'float32'), ('completed', 'bool')]),
+    ('CourseResult', [('result_id', 'int32'), ('course_id', 'int32'),
+                      ('ninja_id', 'int32'), ('duration', 'float32'),
+                      ('finish_point', 'int32'), ('completed', 'bool')]),
+    ('CareerSummary', [('ninja_id', 'int32'), ('best_finish', 'text'),
+                       ('speed', 'float64'), ('success', 'float64'),
+                       ('consistency', 'float64'), ('rating', 'float64'),
+                       ('seasons', 'int32'), ('qualifying', 'int32'),
+                       ('finals', 'int32'), ('stages', 'int32')]),
+    ('ObstacleLeaderboard', [('obstacle_id', 'int32'), ('place', 'int32'),
+                             ('ninja_id', 'int32'), ('time', 'float32')]),
+    ('ObstacleStats', [('obstacle_id', 'int32'), ('attempts', 'int32'),
+                       ('completions', 'int32'), ('p50_split', 'float32'),
+                       ('p90_split', 'float32')]),
+    ('CourseStats', [('course_id', 'int32'), ('attempts', 'int32'),
+                     ('completions', 'int32'), ('p50_finish', 'float32'),
+                     ('p90_finish', 'float32'), ('p50_time', 'float32'),
+                     ('p90_time', 'float32')]),
+])
+
+
+def encode(values, dtype):
+    """Convert a column of database values to the arrays it's stored as.
+
+    Returns:
+        (np.ndarray, np.ndarray): (the column, its levels if it's text, else
+                                  None).
+
+    Examples:
+        >>> column, levels = encode(['b', None, 'a', 'b'], 'text')
+        >>> column.tolist(), levels.tolist()
+        ([1, -1, 0, 1], ['a', 'b'])
+        >>> encode([3, None], 'int32')[0].tolist()
+        [3, -1]
+        >>> encode(['1.25', None], 'float32')[0].tolist()
+        [1.25, nan]
+    """
+    if dtype == 'text':
+        known = [i for i, v in enumerate(values) if v is not None]
+        column = np.full(len(values), -1, np.int32)
+        if not known:
+            return column, np.array([], str)
+        levels, idx = codes([values[i] for i in known])
+        column[known] = idx
+        return column, levels
+    if dtype.startswith('float'):
+        return to_float(values).astype(dtype), None
+    if dtype == 'bool':
+        return np.array(values, bool), None
+    return np.array([-1 if v is None else v for v in values], dtype), None
+
+
+def replace_file(path, write):
+    """Write a new file at `path` by calling `write` with a file object, then
+    rename it over the old one.
+
+    Readers that have the old file open (or memory-mapped) keep reading it,
+    rather than seeing it change under them.
+    """
+    temp = path.with_name(path.name + '.tmp')
+    with temp.open('wb') as f:
+        write(f)
+    os.replace(str(temp), str(path))
+
+
+def export(db, root):
+    """Write every table in `SCHEMA` to the bundle directory `root`.
+
+    If there's already a bundle in `root`, its manifest is removed first, so
+    the directory isn't mistaken for a complete bundle until the new
+    manifest is written.
+
+    Returns:
+        dict: The manifest.
+    """
+    root = pathlib.Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        (root / MANIFEST).unlink()
+    except FileNotFoundError:
+        pass
+    manifest = {'version': VERSION, 'tables': collections.OrderedDict()}
+    for table, columns in SCHEMA.items():
+        names = [name for name, _ in columns]
+        rows = db.query('SELECT {0} FROM {1} ORDER BY {0}'.format(
+            ', '.join(names), table))
+        entry = {'rows': len(rows), 'columns': collections.OrderedDict()}
+        for i, (name, dtype) in enumerate(columns):
+            column, levels = encode([row[i] for row in rows], dtype)
+            info = {'dtype': dtype, 'file': '{0}.{1}.npy'.format(table, name)}
+            replace_file(root / info['file'],
+                         lambda f, column=column: np.save(f, column))
+            if levels is not None:
+                info['levels'] = '{0}.{1}.levels.npy'.format(table, name)
+                replace_file(root / info['levels'],
+                             lambda f, levels=levels: np.save(f, levels))
+            entry['columns'][name] = info
+        manifest['tables'][table] = entry
+
+    # The manifest goes last, so a bundle with one is complete.
+    replace_file(root / MANIFEST, lambda f: f.write(
+        json.dumps(manifest, indent=2).encode('utf-8')))
+    return manifest
+
+
+class Bundle(object):
+    """The memory-mapped columns of an exported bundle.
+
+    Columns are only read from disk as they're used. Text columns are their
+    codes; see `levels` and `text`.
+    """
+
+    def __init__(self, root):
+        self.root = pathlib.Path(root)
+        with (self.root / MANIFEST).open() as f:
+            self.manifest = json.load(f)
+        if self.manifest['version'] != VERSION:
+            raise ValueError(
+                '{0} is a version {1} bundle (expected {2})'.format(
+                    self.root, self.manifest['version'], VERSION))
+        self._levels = {}
+        self.tables = {}
+        for table, entry in self.manifest['tables'].items():
+            self.tables[table] = {
+                name: np.load(str(self.root / info['file']), mmap_mode='r')
+                for name, info in entry['columns'].items()
+            }
+
+    def column(self, table, column):
+        """Get a column (the codes, for text columns).
+        """
+        return self.tables[table][column]
+
+    def levels(self, table, column):
+        """Get the sorted unique values of a text column.
+        """
+        if (table, column) not in self._levels:
+            info = self.manifest['tables'][table]['columns'][column]
+            self._levels[table, column] = np.load(
+                str(self.root / info['levels']), mmap_mode='r')
+        return self._levels[table, column]
+
+    def text(self, table, column):
+        """Decode a text column.
+
+        Returns:
+            np.ndarray: An object array of strings (None where missing).
+        """
+        idx = np.asarray(self.column(table, column))
+        levels = np.asarray(self.levels(table, column), object)
+        out = np.full(len(idx), None, object)
+        out[idx >= 0] = levels[idx[idx >= 0]]
+        return out
+
+
+def load(root):
+    """Open the bundle in `root` (see `export`).
+    """
+    return Bundle(root)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export the database to a directory of .npy files.')
+    parser.add_argument('root', type=pathlib.Path, help='the output directory')
+    parser.add_argument(
+        '--database', help='the database URL; defaults to $DATABASE_URL')
+    args = parser.parse_args()
+
+    db = connect(args.database)
+    manifest = export(db, args.root)
+    db.close()
+    print('Wrote {0} rows to {1}.'.format(
+        sum(t['rows'] for t in manifest['tables'].values()), args.root))
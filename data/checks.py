@@ -0,0 +1,230 @@
+"""checks.py
+
+Validates a whole course CSV file at once. The rows are turned into a matrix
+of cells, which is parsed into a matrix of numbers (and a mask of the cells
+that are numbers), and then every rule of `util.row_errors` is applied to
+all of the rows with array operations:
+
+* each row has as many cells as there are headings;
+* no Transition column is marked "F";
+* the splits, read from the first obstacle up to the first blank, "F" or
+  Total column, are numbers;
+* a failed run has no time for the obstacle it failed;
+* the splits of a shown (S) run add up to its Total.
+
+`course_errors` finds exactly what `util.row_errors` would for each row, in
+the same order (so ``util.find_errors`` is a thin wrapper around it).
+"""
+import collections
+import itertools
+
+import numpy as np
+
+from util import NAME_STATUS, Issue, name_and_status
+
+# Rule numbers, which order the problems found in a row.
+LENGTH, TRANSITION, SPLIT, FAILED, TOTAL = range(5)
+# The number of rows that callers streaming a file check at a time.
+CHECK_CHUNK = 5000
+
+
+def encode_cells(rows, start=0, stop=None):
+    """Dictionary-encode the cells of `rows` (which are all the same length)
+    between the columns `start` and `stop`.
+
+    Returns:
+        (np.ndarray, List[str]): (a 2-D array of each cell's code, the string
+                                 of each code).
+
+    Examples:
+        >>> codes, levels = encode_cells([['1.5', 'F'], ['', '1.5']])
+        >>> codes.tolist(), levels
+        ([[0, 1], [2, 0]], ['1.5', 'F', ''])
+    """
+    index = collections.defaultdict(itertools.count().__next__)
+    codes = list(
+        map(index.__getitem__,
+            itertools.chain.from_iterable(row[start:stop] for row in rows)))
+    return (np.array(codes, np.intp).reshape(len(rows), -1), list(index))
+
+
+def parse_levels(levels):
+    """Parse each string in `levels` with `float`.
+
+    Returns:
+        (np.ndarray, np.ndarray): (the values, with NaN for strings that
+                                  aren't numbers, and a mask of the strings
+                                  that are numbers).
+
+    Examples:
+        >>> values, numeric = parse_levels(['1.5', 'F', '', '2'])
+        >>> values.tolist(), numeric.tolist()
+        ([1.5, nan, nan, 2.0], [True, False, False, True])
+    """
+    values = np.full(len(levels), np.nan)
+    numeric = np.zeros(len(levels), bool)
+    for i, text in enumerate(levels):
+        try:
+            values[i] = float(text)
+            numeric[i] = True
+        except ValueError:
+            pass
+    return values, numeric
+
+
+def rounding_differs(a, b):
+    """Find where ``round(a, 2) != round(b, 2)``, element-wise.
+
+    Both are rounded to whole hundredths with `np.rint`, which only differs
+    from Python's (correctly rounded) `round` when a value is within a
+    rounding error of halfway between two hundredths; those few values are
+    left to `round`.
+
+    Examples:
+        >>> rounding_differs(np.array([6.5, 2.0, 0.125, 1.0]),
+        ...                  np.array([6.499999, 2.01, 0.12, np.nan])).tolist()
+        [False, True, False, True]
+    """
+    scaled = np.stack([a, b]) * 100
+    with np.errstate(invalid='ignore'):
+        exact = (np.isfinite(scaled) & (np.abs(scaled) < 2**40) &
+                 (np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6))
+    differs = np.rint(scaled[0]) != np.rint(scaled[1])
+    for i in np.flatnonzero(~(exact[0] & exact[1])):
+        differs[i] = round(float(a[i]), 2) != round(float(b[i]), 2)
+    return differs
+
+
+def course_errors(rows, layout, start=2):
+    """Find every problem in the course CSV `rows` (without the headings).
+
+    Args:
+        layout (CourseLayout): The layout of the rows' file.
+        start (int): The line number of the first row.
+
+    Returns:
+        List[Issue]: The problems, in the order `util.row_errors` finds them,
+                     row by row.
+
+    Examples:
+        >>> from util import CourseLayout
+        >>> layout = CourseLayout.compile(
+        ...     ['Name', 'Age', 'Gender', 'Log Grip', 'Transition 1',
+        ...      'Warped Wall', 'Total', 'Result'])
+        >>> rows = [['Jon Horton', '30', 'M', '1.5', 'F', '', '', 'Failed'],
+        ...         ['Jon Hoton', '30', 'M'],
+        ...         ['Jo Jo Bynum', '37', 'M', '1', 'x', '1', '', 'Failed'],
+        ...         ['Kevin Bull', '31', 'M', '1', '1', '1', '2', 'Completed']]
+        >>> for issue in course_errors(rows, layout):
+        ...     print(issue.row, issue.column, issue.message)
+        2 4 Invalid failure point
+        2 3 Time for failed obstacle (1.5)
+        3 None Length mismatch (3 vs. expected 8)
+        4 4 Bad split (x)
+        5 6 3.0 != 2.0
+    """
+    expected = len(layout.headings)
+    found = []
+    full = []
+    positions = []
+    for i, row in enumerate(rows):
+        if len(row) == expected:
+            full.append(row)
+            positions.append(i)
+        else:
+            found.append((i, LENGTH, None,
+                          'Length mismatch ({0} vs. expected {1})'.format(
+                              len(row), expected)))
+    if full:
+        found.extend(_matrix_errors(full, positions, layout))
+
+    found.sort(key=lambda f: (f[0], f[1], -1 if f[2] is None else f[2]))
+    return [
+        Issue('error', start + int(i), None if column is None else
+              int(column), message) for i, _, column, message in found
+    ]
+
+
+def _matrix_errors(rows, positions, layout):
+    """Apply the rules to full-length rows.
+
+    Only the obstacle, Transition and Total columns are encoded (see
+    `encode_cells`); column `k` of the codes is column ``k + 3`` of a row.
+
+    Args:
+        positions (List[int]): The index of each row among all of the rows.
+
+    Returns:
+        List[(int, int, int, str)]: (row index, rule, column, message) for
+                                    each problem.
+    """
+    found = []
+    total = layout.total
+    splits = total - 3
+    transition = np.zeros(len(layout.headings), bool)
+    transition[list(layout.transitions)] = True
+    codes, levels = encode_cells(rows, 3, total + 1)
+    values, numeric = parse_levels(levels)
+    fail, blank = (np.array([level == text for level in levels])
+                   for text in ('F', ''))
+    everyone = np.arange(len(rows))
+
+    # Transitions marked "F" (which are never outside of the encoded columns
+    # in a well-formed file).
+    for r, k in zip(*np.nonzero(fail[codes] & transition[3:total + 1])):
+        found.append((positions[r], TRANSITION, k + 3,
+                      'Invalid failure point'))
+    for c in layout.transitions:
+        if not 3 <= c <= total:
+            for r, row in enumerate(rows):
+                if row[c] == 'F':
+                    found.append((positions[r], TRANSITION, c,
+                                  'Invalid failure point'))
+
+    # Splits are read up to the first cell that isn't a number (or Total).
+    halted = ~numeric[codes[:, :splits]]
+    stop = np.where(halted.any(axis=1), halted.argmax(axis=1), splits)
+    stop_code = codes[everyone, stop]
+    bad = (stop < splits) & ~blank[stop_code] & ~fail[stop_code]
+    for r in np.flatnonzero(bad):
+        found.append((positions[r], SPLIT, stop[r] + 3,
+                      'Bad split ({0})'.format(levels[stop_code[r]])))
+
+    # Running totals, added up in the same order as `row_errors` does.
+    split_values = np.where(halted, 0.0, values[codes[:, :splits]])
+    sums = np.cumsum(
+        np.hstack([np.zeros((len(rows), 1)), split_values]), axis=1)
+    sums = sums[everyone, stop]
+
+    # Failed runs with a time for the obstacle they failed.
+    last = stop + 2
+    failed = np.array([row[layout.result] == 'Failed' for row in rows])
+    failed &= ~bad & (last > 2) & ~transition[last]
+    for r in np.flatnonzero(failed):
+        found.append((positions[r], FAILED, last[r],
+                      'Time for failed obstacle ({0})'.format(
+                          rows[r][last[r]])))
+
+    # Shown runs' splits should add up to their Total. Only names with a
+    # "(" can have another status (and names that don't parse at all are
+    # left to the caller).
+    status = {
+        name: name_and_status(name)[1]
+        for name in {row[0] for row in rows}
+        if '(' in name and NAME_STATUS.match(name)
+    }
+    hidden = np.array(
+        [status.get(row[0]) in ('PS', 'NS') for row in rows], bool)
+    checked = ~bad & ~blank[codes[:, splits]] & ~hidden
+    has_total = numeric[codes[:, splits]]
+    for r in np.flatnonzero(checked & ~has_total):
+        found.append((positions[r], TOTAL, total,
+                      'Bad finish time ({0})'.format(rows[r][total])))
+    checked = np.flatnonzero(checked & has_total)
+    observed = values[codes[checked, splits]]
+    for r in checked[rounding_differs(observed, sums[checked])]:
+        # `row_errors` starts its sum from the integer 0.
+        t = float(sums[r]) if stop[r] else 0
+        found.append((positions[r], TOTAL, total, '{0} != {1}'.format(
+            t, round(float(rows[r][total]), 2))))
+    return found
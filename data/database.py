@@ -0,0 +1,381 @@
+"""database.py
+
+A thin layer over a single database connection for building the database,
+which can be PostgreSQL or SQLite (see `connect`).
+
+Every ``.sql`` file in ``data/sql`` is read once, when the connection is
+made. A backend's dialect can override any of them with a file of the same
+name in ``data/sql/<dialect>`` (e.g., ``sqlite/create_tables.sql``).
+Files with several statements (e.g., ``create_tables.sql``) or a DDL
+statement are run one statement at a time, while the rest are prepared the
+first time they're run (server-side by PostgreSQL and in SQLite's statement
+cache), so later calls only send their parameters.
+
+SQLite needs version 3.35 or later, for RETURNING (window functions, JSON1
+and ``VACUUM INTO`` are older), which `connect` checks.
+
+Queries use the same ``:name`` parameters as the SQL files. If a
+connection's `profile` is set (see `instrument.Profile`), every statement's
+time, rows and round-trips are reported to it.
+
+Example:
+    From the root of the repository ::
+
+        db = connect()  # Defaults to $DATABASE_URL.
+        with db.transaction():
+            rows = db.query_file('ninjas.sql')
+"""
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import time
+
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:  # Only needed for PostgreSQL.
+    psycopg2 = None
+
+SQL_DATA = pathlib.Path('data/sql')
+# `:name` parameters, but not `::type` casts or times like '10:30'.
+PARAM = re.compile(r'(?<![:\w]):([A-Za-z_]\w*)')
+COMMENT = re.compile(r'/\*.*?\*/|--[^\n]*', re.DOTALL)
+# The statements that PostgreSQL can PREPARE.
+PREPARABLE = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'VALUES', 'WITH'}
+# The oldest SQLite library that the SQL files run on.
+SQLITE_MINIMUM = (3, 35, 0)
+
+
+def strip_comments(sql):
+    """Remove the comments from `sql`.
+
+    Examples:
+        >>> strip_comments('/**\\n * Get everyone.\\n */\\nSELECT 1 -- one\\n')
+        'SELECT 1'
+    """
+    return COMMENT.sub('', sql).strip()
+
+
+def statements(sql):
+    """Split `sql` (without comments) into its statements.
+
+    Examples:
+        >>> statements('SELECT 1;\\nSELECT 2')
+        ['SELECT 1', 'SELECT 2']
+    """
+    return [s.strip() for s in sql.split(';') if s.strip()]
+
+
+def to_pyformat(sql):
+    """Convert `sql`'s `:name` parameters to psycopg2's `%(name)s` format.
+
+    Examples:
+        >>> to_pyformat("SELECT :a::text, '10%' WHERE b = :b")
+        "SELECT %(a)s::text, '10%%' WHERE b = %(b)s"
+    """
+    return PARAM.sub(r'%(\1)s', sql.replace('%', '%%'))
+
+
+def to_positional(sql):
+    """Convert `sql`'s `:name` parameters to PREPARE's `$n` format.
+
+    Returns:
+        (str, List[str]): (the converted statement, the name of each `$n`).
+
+    Examples:
+        >>> to_positional('SELECT :a, :b, :a')
+        ('SELECT $1, $2, $1', ['a', 'b'])
+    """
+    names = []
+
+    def number(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return '${0}'.format(names.index(match.group(1)) + 1)
+
+    return PARAM.sub(number, sql), names
+
+
+def describe(sql, width=60):
+    """Summarize `sql` on one line of at most `width` characters.
+
+    Examples:
+        >>> describe('SELECT ninja_id\\n  FROM Ninja WHERE ninja_id = 1', 30)
+        'SELECT ninja_id FROM Ninja ...'
+    """
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= width else sql[:width - 3].rstrip() + ' ...'
+
+
+def connect(url=None, sql_dir=SQL_DATA):
+    """Connect to the database at `url`.
+
+    Args:
+        url (str): A PostgreSQL URL, or "sqlite:///<path>" for a SQLite file
+                   (or "sqlite://" for an in-memory database). Defaults to
+                   $DATABASE_URL.
+
+    Returns:
+        Database: A `PostgresDatabase` or `SQLiteDatabase`.
+
+    Raises:
+        RuntimeError: If Python's SQLite library is older than
+                      `SQLITE_MINIMUM`.
+    """
+    url = url or os.environ['DATABASE_URL']
+    if url.startswith('sqlite:'):
+        path = url[len('sqlite:'):]
+        if path.startswith('///'):
+            path = path[3:]
+        elif path.strip('/') in ('', ':memory:'):
+            path = ':memory:'
+        return SQLiteDatabase(path, sql_dir)
+    return PostgresDatabase(url, sql_dir)
+
+
+def source_digest(db):
+    """Summarize which version of each CSV file the database was built from
+    (and which course it was loaded as), from the CsvManifest table.
+
+    Reloading a course gives it a new course_id, so the digest changes with
+    every build that changes the data, and derived files (see
+    `similar.build` and `profiles.build`) can tell whether they were built
+    from the database as it is.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    found = hashlib.sha256()
+    rows = db.query('SELECT path, digest, course_id FROM CsvManifest')
+    for path, digest, course_id in sorted(rows):
+        found.update('{0}\t{1}\t{2}\n'.format(path, digest,
+                                               course_id).encode('utf-8'))
+    return found.hexdigest()
+
+
+class Database(object):
+    """A connection that every statement of a build runs on.
+
+    Statements run inside the connection's current transaction, which is
+    committed or rolled back by `transaction`. Subclasses implement
+    `_query`, `_prepare`, `_execute_prepared` and `insert_rows` for their
+    backend.
+    """
+    dialect = None
+
+    def __init__(self, connection, sql_dir=SQL_DATA):
+        self.connection = connection
+        sql_dir = pathlib.Path(sql_dir)
+        self.sql = {}
+        for directory in (sql_dir, sql_dir / self.dialect):
+            for path in sorted(directory.glob('*.sql')):
+                self.sql[path.name] = strip_comments(path.read_text())
+        self._prepared = {}
+        # An `instrument.Profile` to report statements to (if any).
+        self.profile = None
+
+    def _log(self, label, start, rows, round_trips=1):
+        """Report a statement that started at `start` to `profile`.
+        """
+        if self.profile is not None:
+            self.profile.statement(label, time.perf_counter() - start, rows,
+                                   round_trips)
+
+    def query(self, sql, **params):
+        """Run `sql` with the given `:name` parameters.
+
+        Returns:
+            List[namedtuple]: The rows returned by `sql` (if any).
+        """
+        return self._query(sql, params, describe(sql))
+
+    def query_file(self, name, **params):
+        """Run the SQL file `name` (e.g., "ninjas.sql") from `data/sql`.
+
+        Returns:
+            List[namedtuple]: The rows returned by the file's last statement.
+        """
+        parts = statements(self.sql[name])
+        if len(parts) > 1 or parts[0].split()[0].upper() not in PREPARABLE:
+            rows = []
+            for sql in parts:
+                rows = self._query(sql, params, name)
+            return rows
+        if name not in self._prepared:
+            self._prepared[name] = self._prepare(name, parts[0])
+        return self._execute_prepared(self._prepared[name], params, name)
+
+    def insert_rows(self, table, columns, rows, page_size=1000):
+        """Insert `rows` into `table` with multi-row INSERTs of up to
+        `page_size` rows each.
+        """
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Commit everything run inside the block, or nothing if it raises.
+        """
+        try:
+            yield self
+        except BaseException:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+
+    def rollback(self):
+        """Discard everything since the last commit.
+        """
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+class PostgresDatabase(Database):
+    """A PostgreSQL connection (through psycopg2).
+    """
+    dialect = 'postgresql'
+
+    def __init__(self, url, sql_dir=SQL_DATA):
+        super(PostgresDatabase, self).__init__(psycopg2.connect(url), sql_dir)
+
+    def _execute(self, sql, params, label):
+        start = time.perf_counter()
+        with self.connection.cursor(
+                cursor_factory=psycopg2.extras.NamedTupleCursor) as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else []
+            count = len(rows) if cursor.description else cursor.rowcount
+        self._log(label, start, count)
+        return rows
+
+    def _prepare(self, name, sql):
+        statement, order = to_positional(sql)
+        prepared = 'q_' + re.sub(r'\W', '_', name)
+        self._execute('PREPARE {0} AS {1}'.format(prepared, statement), None,
+                      name + ' (PREPARE)')
+        return prepared, order
+
+    def _execute_prepared(self, prepared, params, label):
+        prepared, order = prepared
+        if not order:
+            return self._execute('EXECUTE {0}'.format(prepared), None, label)
+        return self._execute(
+            'EXECUTE {0} ({1})'.format(prepared, ', '.join(['%s'] * len(
+                order))), [params[key] for key in order], label)
+
+    def _query(self, sql, params, label):
+        return self._execute(to_pyformat(sql), params, label)
+
+    def insert_rows(self, table, columns, rows, page_size=1000):
+        start = time.perf_counter()
+        with self.connection.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor,
+                'INSERT INTO {0} ({1}) VALUES %s'.format(
+                    table, ', '.join(columns)),
+                rows,
+                page_size=page_size)
+        # execute_values sends a statement per page.
+        self._log('INSERT INTO ' + table, start, len(rows),
+                  -(-len(rows) // page_size))
+
+
+class SQLiteDatabase(Database):
+    """A SQLite database file (or ":memory:").
+
+    SQLite has no arrays, so list parameters are sent as JSON (see
+    ``data/sql/sqlite``, which unpacks them with `json_each`).
+    """
+    dialect = 'sqlite'
+
+    def __init__(self, path, sql_dir=SQL_DATA):
+        if sqlite3.sqlite_version_info < SQLITE_MINIMUM:
+            raise RuntimeError(
+                'SQLite {0} is too old (the build needs {1} or later)'.format(
+                    sqlite3.sqlite_version,
+                    '.'.join(map(str, SQLITE_MINIMUM))))
+        connection = sqlite3.connect(path)
+        # Transactions are managed by `transaction` and `rollback`.
+        connection.isolation_level = None
+        connection.execute('PRAGMA foreign_keys = ON')
+        connection.execute('BEGIN')
+        connection.row_factory = self._row
+        super(SQLiteDatabase, self).__init__(connection, sql_dir)
+        self.path = path
+        self._types = {}
+
+    def _row(self, cursor, values):
+        fields = tuple(d[0] for d in cursor.description)
+        if fields not in self._types:
+            self._types[fields] = collections.namedtuple(
+                'Record', fields, rename=True)
+        return self._types[fields](*values)
+
+    @staticmethod
+    def _params(params):
+        return {
+            k: json.dumps(list(v)) if isinstance(v, (list, tuple, set)) else v
+            for k, v in params.items()
+        }
+
+    def _prepare(self, name, sql):
+        return sql  # sqlite3 caches the compiled statement.
+
+    def _execute_prepared(self, sql, params, label):
+        return self._query(sql, params, label)
+
+    def _query(self, sql, params, label):
+        start = time.perf_counter()
+        cursor = self.connection.execute(sql, self._params(params))
+        rows = cursor.fetchall()
+        self._log(label, start,
+                  len(rows) if cursor.description else cursor.rowcount)
+        return rows
+
+    def insert_rows(self, table, columns, rows, page_size=1000):
+        start = time.perf_counter()
+        self.connection.executemany(
+            'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+                table, ', '.join(columns), ', '.join('?' * len(columns))),
+            rows)
+        self._log('INSERT INTO ' + table, start, len(rows))
+
+    @contextlib.contextmanager
+    def transaction(self):
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.connection.execute('COMMIT')
+        self.connection.execute('BEGIN')
+
+    def rollback(self):
+        self.connection.execute('ROLLBACK')
+        self.connection.execute('BEGIN')
+
+    def export(self, path):
+        """Write a compacted, read-only copy of the database to `path`.
+
+        Only what has been committed is copied.
+        """
+        path = pathlib.Path(path)
+        if path.exists():
+            path.chmod(0o644)
+            path.unlink()
+        self.connection.execute('COMMIT')
+        try:
+            self.connection.execute('VACUUM INTO ?', (str(path), ))
+        finally:
+            self.connection.execute('BEGIN')
+        path.chmod(0o444)
+
+    def close(self):
+        self.connection.execute('ROLLBACK')
+        self.connection.close()
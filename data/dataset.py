@@ -0,0 +1,278 @@
+"""dataset.py
+
+A columnar, NumPy-backed view of every course CSV in ``data/csv`` for
+analyses that don't need (or have) a database. The CSV files are parsed once
+and cached in ``data/dataset.npz``, which is rebuilt whenever a CSV file is
+added, removed or modified.
+
+Example:
+    From the root of the repository ::
+
+        $ PYTHONPATH=data python3
+        >>> import dataset
+        >>> ds = dataset.load()
+        >>> stats = ds.obstacle_stats(ds.select(category='Stage 1'))
+
+The arrays are grouped by what they describe, with W being the number of
+obstacles on the longest course:
+
+    courses (C):   course_file, course_city, course_category, course_season,
+                   course_size and course_obstacles (C x W indexes into the
+                   obstacle arrays; -1 past the end of the course).
+    obstacles (O): obstacle_title, obstacle_course and obstacle_position.
+    runs (R):      run_course, run_ninja, run_age, run_sex, run_shown,
+                   splits and transitions (R x W, NaN where there's no time;
+                   the transition in column k precedes obstacle k), failures
+                   (R x W, True where the cell is "F"), totals, finish and
+                   completed.
+
+`course_city`, `course_category`, `course_season`, `run_ninja` and
+`run_shown` are codes into `cities`, `CATEGORIES`, `seasons`, `ninjas` and
+`SHOWN`, respectively.
+"""
+import pathlib
+
+import numpy as np
+
+from util import (course_values, parse_run, read_course, CourseLayout,
+                  TYPE_2_INT)
+
+CSV_DATA = pathlib.Path('data/csv')
+CACHE = pathlib.Path('data/dataset.npz')
+CATEGORIES = sorted(
+    [k for k, v in TYPE_2_INT.items() if v], key=TYPE_2_INT.get)
+SHOWN = ('S', 'PS', 'NS')
+
+
+def to_float(value):
+    """Convert a CSV cell to a float, using NaN for anything but a number.
+
+    Examples:
+        >>> to_float('8.5'), to_float('F'), to_float('')
+        (8.5, nan, nan)
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def codes(values):
+    """Dictionary-encode `values`.
+
+    Returns:
+        (np.ndarray, np.ndarray): (sorted unique values, code of each value).
+
+    Examples:
+        >>> levels, idx = codes(['b', 'a', 'b'])
+        >>> levels.tolist(), idx.tolist()
+        (['a', 'b'], [1, 0, 1])
+    """
+    levels, idx = np.unique(np.asarray(values), return_inverse=True)
+    return levels, idx.astype(np.int32)
+
+
+class Dataset(object):
+    """A set of NumPy arrays describing courses, obstacles and runs.
+
+    See the module's docstring for a description of each array.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for key, value in arrays.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def from_csv(cls, files):
+        """Parse the given course CSV files.
+        """
+        courses = []
+        runs = []
+        for f in files:
+            course_info, headings, rows = read_course(f)
+            layout = CourseLayout.compile(headings, course_info)
+            courses.append((str(f), course_values(course_info), headings,
+                            layout.obstacles))
+            for row in rows:
+                run = parse_run(row, layout)
+                if run.name and run.name != 'Name':
+                    runs.append((len(courses) - 1, run.name, run.shown, row,
+                                 run))
+
+        width = max([len(c[3]) for c in courses] or [0])
+        n_obstacles = sum(len(c[3]) for c in courses)
+        course_obstacles = np.full((len(courses), width), -1, np.int32)
+        obstacle_title = []
+        obstacle_course = np.zeros(n_obstacles, np.int32)
+        obstacle_position = np.zeros(n_obstacles, np.int16)
+        for c, (_, _, headings, columns) in enumerate(courses):
+            for k, column in enumerate(columns):
+                o = len(obstacle_title)
+                obstacle_title.append(headings[column])
+                course_obstacles[c, k] = o
+                obstacle_course[o] = c
+                obstacle_position[o] = k
+
+        cities, course_city = codes([c[1][0] for c in courses])
+        seasons, course_season = codes([int(c[1][2]) for c in courses])
+        ninjas, run_ninja = codes([r[1] for r in runs])
+
+        n = len(runs)
+        splits = np.full((n, width), np.nan, np.float32)
+        transitions = np.full((n, width), np.nan, np.float32)
+        failures = np.zeros((n, width), bool)
+        totals = np.full(n, np.nan, np.float32)
+        finish = np.zeros(n, np.int16)
+        completed = np.zeros(n, bool)
+        run_age = np.full(n, np.nan, np.float32)
+        run_sex = []
+        for r, (c, name, shown, row, run) in enumerate(runs):
+            columns = courses[c][3]
+            cells = [row[i] for i in columns]
+            splits[r, :len(cells)] = [to_float(v) for v in cells]
+            failures[r, :len(cells)] = [v == 'F' for v in cells]
+            transitions[r, 1:len(cells)] = [
+                to_float(row[i - 1]) for i in columns[1:]
+            ]
+            totals[r] = to_float(row[-2])
+            run_age[r] = to_float(row[1])
+            run_sex.append(row[2].strip())
+            completed[r] = run.completed
+            finish[r] = run.finish
+
+        return cls({
+            'cities': cities,
+            'seasons': seasons,
+            'ninjas': ninjas,
+            'course_file': np.array([c[0] for c in courses], str),
+            'course_city': course_city,
+            'course_category': np.array(
+                [CATEGORIES.index(c[1][1]) for c in courses], np.int8),
+            'course_season': course_season,
+            'course_size': np.array([len(c[3]) for c in courses], np.int16),
+            'course_obstacles': course_obstacles,
+            'obstacle_title': np.array(obstacle_title, str),
+            'obstacle_course': obstacle_course,
+            'obstacle_position': obstacle_position,
+            'run_course': np.array([r[0] for r in runs], np.int32),
+            'run_ninja': run_ninja,
+            'run_age': run_age,
+            'run_sex': np.array(run_sex, str),
+            'run_shown': np.array([SHOWN.index(r[2]) for r in runs], np.int8),
+            'splits': splits,
+            'transitions': transitions,
+            'failures': failures,
+            'totals': totals,
+            'finish': finish,
+            'completed': completed
+        })
+
+    def save(self, path, key=None):
+        """Write the arrays (and an optional cache `key`) to a `.npz` file.
+        """
+        arrays = dict(self.arrays)
+        if key is not None:
+            arrays['key'] = key
+        with pathlib.Path(path).open('wb') as f:
+            np.savez(f, **arrays)
+
+    def select(self, category=None, season=None, city=None, shown='S'):
+        """Build a mask of the runs matching the given filters.
+
+        Args:
+            category (str): One of `CATEGORIES`.
+            season (int): A season number.
+            city (str): A city (e.g., "Las Vegas" for the stages).
+            shown (str): One of `SHOWN` or None for any.
+
+        Returns:
+            np.ndarray: A boolean mask over the runs.
+        """
+        mask = np.ones(len(self.run_course), bool)
+        if category is not None:
+            mask &= self.course_category[self.run_course] == CATEGORIES.index(
+                category)
+        if season is not None:
+            mask &= self.seasons[self.course_season[self.run_course]] == season
+        if city is not None:
+            mask &= self.cities[self.course_city[self.run_course]] == city
+        if shown is not None:
+            mask &= self.run_shown == SHOWN.index(shown)
+        return mask
+
+    def obstacle_stats(self, runs=None):
+        """Compute per-obstacle statistics over the given runs.
+
+        Args:
+            runs (np.ndarray): A boolean mask over the runs (see `select`);
+                               defaults to every shown run.
+
+        Returns:
+            dict: Arrays indexed like the obstacle arrays: `attempts`,
+                  `completions`, `completion_rate`, `median` (split) and
+                  `fastest` (split). Statistics without any data are NaN.
+        """
+        if runs is None:
+            runs = self.select()
+        n = len(self.obstacle_title)
+        obstacles = self.course_obstacles[self.run_course[runs]]
+        splits = self.splits[runs]
+        done = ~np.isnan(splits) & (obstacles >= 0)
+        # The obstacle a run ended on was attempted even though it has no
+        # time.
+        position = np.arange(obstacles.shape[1])
+        ended = position == self.finish[runs][:, None] - 1
+        attempted = done | (ended & (obstacles >= 0))
+
+        attempts = np.bincount(obstacles[attempted], minlength=n)
+        completions = np.bincount(obstacles[done], minlength=n)
+
+        median = np.full(n, np.nan)
+        fastest = np.full(n, np.nan)
+        values = splits[done].astype(np.float64)
+        ids = obstacles[done]
+        if len(values):
+            order = np.lexsort((values, ids))
+            values, ids = values[order], ids[order]
+            present = np.flatnonzero(completions)
+            starts = np.searchsorted(ids, present)
+            counts = completions[present]
+            fastest[present] = values[starts]
+            median[present] = (values[starts + (counts - 1) // 2] +
+                               values[starts + counts // 2]) / 2
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rate = completions / attempts
+        return {
+            'attempts': attempts,
+            'completions': completions,
+            'completion_rate': rate,
+            'median': median,
+            'fastest': fastest
+        }
+
+
+def load(root=CSV_DATA, cache=CACHE):
+    """Load every course CSV under `root`, using `cache` if it's current.
+
+    Args:
+        cache (pathlib.Path): A `.npz` file to read the arrays from (if it was
+                              built from the current CSV files) or write them
+                              to (otherwise). None disables caching.
+
+    Returns:
+        Dataset: The parsed CSV files.
+    """
+    files = sorted(root.glob('**/*.csv'))
+    key = np.array(
+        ['{0}:{1}'.format(f, f.stat().st_mtime_ns) for f in files], str)
+    if cache is not None and cache.exists():
+        with np.load(str(cache)) as data:
+            if np.array_equal(data['key'], key):
+                return Dataset({k: data[k] for k in data.files if k != 'key'})
+
+    dataset = Dataset.from_csv(files)
+    if cache is not None:
+        dataset.save(cache, key)
+    return dataset
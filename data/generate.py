@@ -1,22 +1,57 @@
 #!/usr/bin/env python3
-import csv
-import json
+import argparse
+import collections
+import cProfile
+import concurrent.futures
+import functools
+import itertools
 import pathlib
 
-import records
-
-from util import (query_file, name_and_status, is_number, finish_point,
-                  TYPE_2_INT, FINISH_2_NAME)
+import numpy as np
+
+import bundle
+import instrument
+import profiles
+import rating
+import similar
+import stats
+from checks import CHECK_CHUNK, course_errors
+from database import connect, source_digest
+from plans import check_plans
+from roster import Roster
+from util import (CourseLayout, file_digest, name_and_status, parse_run,
+                  stream_course, course_values)
 
 CSV_DATA = pathlib.Path('data/csv')
 META_DATA = pathlib.Path('data/meta.json')
-TABLES = [
-    'Ninja', 'Course', 'Obstacle', 'ObstacleResult', 'CourseResult',
-    'CareerSummary'
-]
-
-
-def insert_ninja(db, row):
+# The columns written by the bulk loader, keyed by table. The first column of
+# each table, except for those in `NATURAL_KEYS`, is its serial primary key,
+# which we assign client-side.
+COLUMNS = collections.OrderedDict([
+    ('Ninja', ('ninja_id', 'first_name', 'last_name', 'sex', 'age',
+               'occupation', 'instagram', 'twitter')),
+    ('Course', ('course_id', 'city', 'category', 'season', 'size')),
+    ('Obstacle', ('obstacle_id', 'title', 'course_id')),
+    ('ObstacleResult', ('result_id', 'obstacle_id', 'ninja_id', 'duration',
+                        'transition', 'completed')),
+    ('CourseResult', ('result_id', 'course_id', 'ninja_id', 'duration',
+                      'finish_point', 'completed')),
+    ('CareerSummary', ('summary_id', 'ninja_id', 'best_finish', 'speed',
+                       'success', 'consistency', 'rating', 'seasons',
+                       'qualifying', 'finals', 'stages')),
+    ('CsvManifest', ('path', 'digest', 'course_id')),
+    ('ObstacleStats', ('obstacle_id', 'attempts', 'completions', 'p50_split',
+                       'p90_split')),
+    ('CourseStats', ('course_id', 'attempts', 'completions', 'p50_finish',
+                     'p90_finish', 'p50_time', 'p90_time')),
+])
+# The tables keyed by something other than a serial ID.
+NATURAL_KEYS = {'CsvManifest', 'ObstacleStats', 'CourseStats'}
+# The number of rows sent per multi-row INSERT statement.
+BATCH_SIZE = 1000
+
+
+def insert_ninja(db, row, roster, season):
     """Add a row to the Ninja table.
 
     `row` is CSV entry like
@@ -25,6 +60,10 @@ def insert_ninja(db, row):
 
     where the first 3 columns represent a competitor's name, age, and sex.
 
+    Args:
+        roster (Roster): The competitors we've already seen.
+        season (str): The season of the current course.
+
     Returns:
         (str, int): (shown status, ninja_id).
     """
@@ -35,28 +74,19 @@ def insert_ninja(db, row):
         return '', -1
 
     first, last = name.split(' ', 1)
-    out = db.query(
-        'SELECT ninja_id FROM Ninja WHERE first_name=:f AND last_name=:l',
-        f=first,
-        l=last).all()
-
-    # TODO: What if two competitors have the same first + last name?
-    if not out:
-        with META_DATA.open() as meta:
-            data = json.load(meta)
-
-        info = data.get('{0} {1}'.format(first, last), {})
+    ninja_id = roster.find(first, last, sex, age, season)
+    if ninja_id is None:
+        info = roster.info(first, last)
         ninja_id = db.query_file(
-            'data/sql/insert_ninja.sql',
+            'insert_ninja.sql',
             f=first,
             l=last,
             s=sex,
             a=age,
             o=info.get('occupation'),
             i=info.get('instagram'),
-            t=info.get('twitter')).all()[0].ninja_id
-    else:
-        ninja_id = out[0].ninja_id
+            t=info.get('twitter'))[0].ninja_id
+        roster.add(ninja_id, first, last, sex, age, season)
 
     return shown, ninja_id
 
@@ -71,214 +101,604 @@ def insert_course(db, headings, info):
     Returns:
         int: The ID of the current course.
     """
-    city = info[0] if info[0] != 'Stage' else 'Las Vegas'
-    cat = info[1] if not is_number(info[1]) else 'Stage ' + info[1]
+    city, cat, season = course_values(info)
     course_id = db.query_file(
-        'data/sql/insert_course.sql', city=city, cat=cat, s=info[2]).all()
+        'insert_course.sql', city=city, cat=cat, s=season)
     return course_id[0].course_id
 
 
-def insert_obstacles(db, row, info, cid):
+def insert_obstacles(db, layout, cid):
     """Add a row to the Obstacle table.
 
     Args:
-        info (list): [city, category, season]
+        layout (CourseLayout): The layout of the course's CSV file.
 
     Returns:
-        int: The ID of the current course.
+        Dict[int, int]: The ID of the obstacle in each column of the file, so
+                        obstacles with the same title get their own IDs.
     """
-    size = 0
-    for i in range(3, len(row) - 2):  # Skip The first 3 and last 2 columns.
-        name = row[i]
-        if name.startswith('Transition'):  # It's a transition column.
-            continue
-        db.query_file('data/sql/insert_obstacle.sql', title=name, id=cid)
-        size += 1
+    obstacle_ids = {}
+    for i in layout.obstacles:
+        obstacle_ids[i] = db.query_file(
+            'insert_obstacle.sql', title=layout.headings[i],
+            id=cid)[0].obstacle_id
     db.query(
-        'UPDATE Course SET size = :s WHERE course_id = :id;', s=size, id=cid)
+        'UPDATE Course SET size = :s WHERE course_id = :id;',
+        s=len(obstacle_ids),
+        id=cid)
+    return obstacle_ids
 
 
-def insert_obstacle_results(db, row, nid, cid, shown, headings):
+def insert_obstacle_results(db, run, nid, obstacle_ids, failed):
     """Add rows to the ObstacleResult table.
 
     Args:
+        run (Run): The competitor's parsed row (see `util.parse_run`).
         nid (int): An ID of a column in the Ninja table.
-        cid (int) An ID of a column in the Course table.
-        shown (str): "S", "PS" or "NS".
-        headers (list): The CSV headers.
+        obstacle_ids (Dict[int, int]): The obstacle IDs returned by
+                                       `insert_obstacles`.
+        failed (Set[int]): The competitors who have already failed an
+                           obstacle on this course, whose later runs aren't
+                           recorded. `nid` is added if this run fails one.
     """
-    if shown == 'NS':  # There are no results.
-        return
-    elif shown == 'PS':  # There are partial results.
+    if run.shown == 'PS':  # There are partial results.
         print('Skipping PS ...')
-        # TODO: Handle PS (alter FAILED_IDS?)
+        # TODO: Handle PS (alter `failed`?)
         return
-    i = 0
-    while i < len(headings) and nid not in FAILED_IDS:
-        header = headings[i]
-        if header == 'Gender' or header.startswith('Transition'):
-            # If the current column is either 'Gender' or 'Transition', we know
-            # that the next column's header (i + 1) will be the obstacle label.
-            name = headings[i + 1]
-            out = db.query(
-                """
-                SELECT obstacle_id FROM Obstacle
-                WHERE (title=:title AND course_id=:id)
-                """,
-                title=name,
-                id=cid).all()
-            # Given that the current header is 'Gender' or 'Transition', we
-            # know that the value at the next column will be the time.
-            time = row[i + 1]
-            completed = is_number(time)
-            if not completed:
-                FAILED_IDS.append(nid)
-                time = 0
-            if header == 'Gender':
-                # This is the first obstacle and therefore is the only one
-                # without a transition.
-                transition = 0
-                i += 1
-            else:
-                transition = row[i]
-                i += 2
-            db.query_file(
-                'data/sql/insert_obstacle_result.sql',
-                nid=nid,
-                dur=time,
-                trans=transition,
-                comp=completed,
-                obsid=out[0].obstacle_id)
-        else:
-            i += 1
-
-
-def insert_course_result(db, row, cid, nid, shown, obstacles):
+    elif nid in failed:
+        return
+    for column, time, transition, completed in run.obstacles:
+        if not completed:
+            failed.add(nid)
+        db.query_file(
+            'insert_obstacle_result.sql',
+            nid=nid,
+            dur=time,
+            trans=transition,
+            comp=completed,
+            obsid=obstacle_ids[column])
+
+
+def insert_course_result(db, run, cid, nid):
     """Add columns to the CourseResult table.
 
     Args:
+        run (Run): The competitor's parsed row (see `util.parse_run`).
         nid (int): An ID of a column in the Ninja table.
         cid (int) An ID of a column in the Course table.
-        shown (str): "S", "PS" or "NS".
     """
-    # time is the second-to-last column.
-    time = row[-2] or None
-    # completed is the last column.
-    completed = row[-1] == 'Completed'
-
-    results = db.query_file(
-        'data/sql/obstacles_by_ninja.sql', nid=nid, comp=completed,
-        crid=cid).all()[0].count
-
-    # Calculate the finish point.
-    finish = finish_point(row, shown, results, obstacles, completed)
-
     db.query_file(
-        'data/sql/insert_course_result.sql',
+        'insert_course_result.sql',
         crid=cid,
         nid=nid,
-        dur=time,
-        fp=finish,
-        comp=completed).all()
+        dur=run.duration,
+        fp=run.finish,
+        comp=run.completed)
 
 
-def insert_summary(db):
-    """Insert a row into the CareerSummary table.
+def fetch_arrays(db, query, columns, **kwargs):
+    """Run the given query and collect the given columns into NumPy arrays.
+
+    Returns:
+        Dict[str, np.ndarray]: The values of each column.
     """
-    # Get all course results for ninja_id.
-    n = len(TYPE_2_INT)
-    for row in db.query('SELECT ninja_id FROM Ninja').all():
-        ninja_id = row.ninja_id
-        completes = [0] * n
-        finishes = [0] * n
-        finish_scores = [0] * n
-        seasons = set()
-        trend = []
-        places = []
-
-        # Walk through their career history and record course finishes.
-        for ret in query_file(db, 'results_by_ninja.sql', nid=ninja_id):
-            int_type = TYPE_2_INT[ret.category]
-            type_idx = int(int_type / 2) - 1
-            seasons.add(ret.season)
-            if ret.completed:
-                # The course was completed, so there's no fail point.
-                completes[type_idx] += 1
-                point = ret.size
-            else:
-                # The course wasn't completed, so there's a fail point.
-                point = ret.finish_point - 1
-            finishes[type_idx] += int_type + 0.1 * point
-            finish_scores[type_idx] += int_type + point
-            trend.append(point)
-
-            # Record the fastest competitors on each obstacle for this course.
-            obs = query_file(db, 'obstacles_by_course.sql', id=ret.course_id)
-            for ob in obs:
-                leaders = [
-                    l.ninja_id
-                    for l in query_file(
-                        db, 'leaders.sql', obs_id=ob.obstacle_id)
-                ]
-                if ninja_id in leaders:
-                    places.append(leaders.index(ninja_id) + 1)
-                else:
-                    places.append(0)
+    rows = db.query_file(query, **kwargs)
+    return {c: np.array([getattr(r, c) for r in rows]) for c in columns}
+
+
+def insert_summary(db, ninja_ids=None):
+    """Insert a row into the CareerSummary table for every competitor.
+
+    The summaries are computed in one pass by `rating.summarize`.
+
+    Args:
+        ninja_ids (Set[int]): If given, only (re)compute the summaries of these
+                              competitors.
+    """
+    if ninja_ids is None:
+        ninjas = db.query('SELECT ninja_id FROM Ninja ORDER BY ninja_id')
+    else:
+        ninjas = db.query_file('ninjas_by_id.sql', ids=sorted(ninja_ids))
+        db.query_file('delete_summaries.sql', ids=sorted(ninja_ids))
+    ninja_ids = [row.ninja_id for row in ninjas]
+
+    summary = rating.summarize(
+        ninja_ids,
+        fetch_arrays(db, 'course_results.sql', [
+            'ninja_id', 'course_id', 'category', 'season', 'completed', 'size',
+            'finish_point'
+        ]),
+        fetch_arrays(db, 'placings.sql', ['obstacle_id', 'ninja_id', 'place']),
+        fetch_arrays(db, 'obstacles_by_course.sql',
+                     ['obstacle_id', 'course_id']))
+
+    first = next_id(db, 'CareerSummary')
+    bulk_insert(db, 'CareerSummary', [
+        (first + i, ninja_id, summary['best'][i], summary['speed'][i],
+         summary['success'][i], summary['consistency'][i],
+         summary['rating'][i], summary['seasons'][i],
+         summary['qualifying'][i], summary['finals'][i], summary['stages'][i])
+        for i, ninja_id in enumerate(ninja_ids)
+    ])
+
+
+def insert_stats(db):
+    """Compute the ObstacleLeaderboard, ObstacleStats and CourseStats rows of
+    every course that doesn't have them yet.
+
+    A course's rows are deleted along with it (see `delete_course.sql`), so
+    after an incremental build, only the added and changed courses are
+    computed. CourseStats is written last, since it marks a course as done.
+
+    Returns:
+        int: The number of courses computed.
+    """
+    course_ids = [r.course_id for r in db.query_file('stale_courses.sql')]
+    if not course_ids:
+        return 0
+    obstacle_ids = [
+        r.obstacle_id for r in db.query_file('stale_obstacles.sql')
+    ]
+    db.query_file('insert_leaderboard.sql')
+
+    obstacles = stats.obstacle_stats(
+        obstacle_ids,
+        fetch_arrays(db, 'stale_obstacle_results.sql',
+                     ['obstacle_id', 'duration', 'completed']))
+    bulk_insert(db, 'ObstacleStats', [
+        (obstacle_id, ) + tuple(obstacles[c][i]
+                                for c in COLUMNS['ObstacleStats'][1:])
+        for i, obstacle_id in enumerate(obstacle_ids)
+    ])
+
+    courses = stats.course_stats(
+        course_ids,
+        fetch_arrays(db, 'stale_course_results.sql',
+                     ['course_id', 'finish_point', 'duration', 'completed']))
+    bulk_insert(db, 'CourseStats', [
+        (course_id, ) + tuple(courses[c][i]
+                              for c in COLUMNS['CourseStats'][1:])
+        for i, course_id in enumerate(course_ids)
+    ])
+    return len(course_ids)
+
+
+def checked(rows, layout, path):
+    """Pass `rows` through, stopping at the first one with an error.
+
+    The rows are checked `CHECK_CHUNK` at a time, and none of a chunk is
+    passed through until all of it has been.
+
+    Raises:
+        ValueError: If a row has an error (see `checks.course_errors`).
+    """
+    rows = iter(rows)
+    line = 2
+    while True:
+        chunk = list(itertools.islice(rows, CHECK_CHUNK))
+        if not chunk:
+            return
+        for issue in course_errors(chunk, layout, line):
+            if issue.level == 'error':
+                raise ValueError('{0}:{1}: {2}'.format(path, issue.row,
+                                                       issue.message))
+        for row in chunk:
+            yield row
+        line += len(chunk)
+
+
+def parse_runs(rows, layout):
+    """Parse each row with `util.parse_run`, skipping rows without a name.
+
+    Yields:
+        (Run, List[str]): (parsed run, row).
+    """
+    for row in rows:
+        run = parse_run(row, layout)
+        if run.name and run.name != 'Name':
+            yield run, row
+
+
+def parse_course(path, lazy=True):
+    """Read, validate and parse the course CSV file at `path`.
+
+    Args:
+        lazy (bool): If True, the runs are parsed as they're iterated over;
+                     otherwise, they're parsed up front into a list (which
+                     can be sent back from a worker process).
+
+    Returns:
+        (List[str], CourseLayout, Iterable[Run], str): (course info, layout,
+                                                       runs, file digest).
+    """
+    course_info, headings, rows = stream_course(path)
+    layout = CourseLayout.compile(headings, course_info)
+    runs = (run for run, _ in parse_runs(checked(rows, layout, path), layout))
+    return (course_info, layout, runs if lazy else list(runs),
+            file_digest(path))
+
+
+def parse_courses(files, jobs=1):
+    """Parse the given CSV files (see `parse_course`) in order.
+
+    Args:
+        jobs (int): The number of worker processes to parse the files across;
+                    1 parses them lazily in this process.
+    """
+    if jobs == 1:
+        for f in files:
+            yield parse_course(f)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            for parsed in pool.map(
+                    functools.partial(parse_course, lazy=False), files):
+                yield parsed
+
+
+def build_rows(files, roster, ids=None, jobs=1):
+    """Parse the given CSV files into rows for every table in `COLUMNS`.
+
+    With `jobs` = 1, files are read one row at a time, so only the row being
+    parsed (and the competitors seen so far) are held in memory. Otherwise,
+    files are read, validated and parsed across `jobs` worker processes. In
+    both cases, competitors are resolved and IDs are assigned here, in file
+    order, so the rows are the same no matter how many workers there are.
+    They're also the IDs that the row-by-row inserts would have been given by
+    the database.
+
+    Args:
+        roster (Roster): The competitors we've already seen. New competitors
+                         are added to it.
+        ids (Dict[str, int]): The first ID to assign in each table (1 by
+                              default).
+        jobs (int): The number of worker processes.
+
+    Yields:
+        (str, tuple): (table, row), where a row never comes before the rows
+                      it references. CareerSummary is filled in afterwards by
+                      `insert_summary`.
+    """
+    ids = ids or {}
+    counts = collections.Counter()
+
+    def next_id(table):
+        counts[table] += 1
+        return ids.get(table, 1) + counts[table] - 1
+
+    for f, (course_info, layout, runs, digest) in zip(
+            files, parse_courses(files, jobs)):
+        print('Reading {} ...'.format(f.parts[-1]))
+        course_id = next_id('Course')
+        yield 'Course', (course_id, ) + course_values(course_info) + (
+            len(layout.obstacles), )
+        obstacle_ids = {}
+        for i in layout.obstacles:
+            obstacle_ids[i] = next_id('Obstacle')
+            yield 'Obstacle', (obstacle_ids[i], layout.headings[i], course_id)
+        yield 'CsvManifest', (str(f), digest, course_id)
+
+        # Competitors who fail an obstacle only have that run's obstacle
+        # results recorded.
+        failed = set()
+        for run in runs:
+            first, last = run.name.split(' ', 1)
+            ninja_id = roster.find(first, last, run.sex, run.age,
+                                   course_info[2])
+            if ninja_id is None:
+                ninja_id = next_id('Ninja')
+                roster.add(ninja_id, first, last, run.sex, run.age,
+                           course_info[2])
+                info = roster.info(first, last)
+                yield 'Ninja', (ninja_id, first, last, run.sex, run.age,
+                                info.get('occupation'), info.get('instagram'),
+                                info.get('twitter'))
+
+            if run.shown == 'PS':
+                print('Skipping PS ...')
+            elif ninja_id not in failed:
+                for column, time, transition, completed in run.obstacles:
+                    if not completed:
+                        failed.add(ninja_id)
+                    yield 'ObstacleResult', (next_id('ObstacleResult'),
+                                             obstacle_ids[column], ninja_id,
+                                             time, transition, completed)
+
+            yield 'CourseResult', (next_id('CourseResult'), course_id,
+                                   ninja_id, run.duration, run.finish,
+                                   run.completed)
+
+
+def next_id(db, table):
+    """Get the next unused ID of `table`'s serial primary key.
+    """
+    return db.query('SELECT COALESCE(MAX({1}), 0) + 1 AS id FROM {0}'.format(
+        table, COLUMNS[table][0]))[0].id
+
 
-        total = sum(trend) if trend else 0
-        n_seasons = len(seasons)
+def write_batches(db, records):
+    """Insert a stream of (table, row) pairs in batches of `BATCH_SIZE`.
 
-        speed = round(3 * sum(x > 0 for x in places) - (sum(places) / len(places)), 3)
-        success = 4 * max(finish_scores)
-        consistency=total * n_seasons
+    Whenever a table's batch fills up, every pending batch is flushed in
+    `COLUMNS` order, so rows are always inserted after the rows they
+    reference. Afterwards, the sequence of every serial primary key is moved
+    past the IDs that were inserted.
 
-        summary_id = query_file(
-            db,
-            'insert_summary.sql',
-            nid=ninja_id,
-            best=FINISH_2_NAME.get(max(finishes)),
-            speed=speed,
-            success=success,
-            consistency=consistency,
-            rating=round(speed + success + consistency, 3),
-            seasons=n_seasons,
-            q=completes[0],
-            f=completes[1],
-            s=completes[2])
+    Returns:
+        collections.Counter: The number of rows inserted into each table.
+    """
+    pending = collections.OrderedDict((table, []) for table in COLUMNS)
+    counts = collections.Counter()
+    last_ids = {}
+
+    def flush():
+        for table, rows in pending.items():
+            if rows:
+                db.insert_rows(table, COLUMNS[table], rows, BATCH_SIZE)
+                counts[table] += len(rows)
+                if table not in NATURAL_KEYS:
+                    last_ids[table] = max(
+                        last_ids.get(table, 0), max(row[0] for row in rows))
+                del rows[:]
+
+    for table, row in records:
+        pending[table].append(row)
+        if len(pending[table]) >= BATCH_SIZE:
+            flush()
+    flush()
+
+    for table, value in last_ids.items():
+        db.query_file(
+            'sync_sequence.sql',
+            table=table,
+            column=COLUMNS[table][0],
+            value=value)
+    return counts
+
+
+def bulk_insert(db, table, rows):
+    """Insert `rows` into `table` using multi-row INSERT statements.
+
+    If `table` has a serial primary key, its sequence is moved past the IDs
+    in `rows`.
+
+    Args:
+        table (str): A key of `COLUMNS`.
+        rows (List[tuple]): Values ordered as in `COLUMNS[table]`.
+    """
+    write_batches(db, ((table, row) for row in rows))
+
+
+def bulk_load(db, files, jobs=1):
+    """Stream the given CSV files into the database in multi-row INSERTs.
+
+    This is equivalent to running `insert_ninja`, `insert_obstacle_results`
+    and friends on every row, but it only needs a handful of round-trips
+    and its memory use doesn't grow with the size of the files.
+
+    Args:
+        jobs (int): The number of worker processes to parse files across
+                    (see `build_rows`).
 
-    return summary_id
+    Returns:
+        Set[int]: The IDs of the competitors with a result in `files`.
+    """
+    roster = Roster.load(db, META_DATA)
+    ids = {
+        table: next_id(db, table)
+        for table in COLUMNS if table not in NATURAL_KEYS
+    }
+
+    touched = set()
+
+    def note_competitors(records):
+        for table, row in records:
+            if table == 'CourseResult':
+                touched.add(row[2])
+            yield table, row
+
+    records = build_rows(files, roster, ids, jobs)
+    if db.profile is not None:
+        records = db.profile.iterate('parse', records)
+    counts = write_batches(db, note_competitors(records))
+    for table in COLUMNS:
+        if counts[table]:
+            print('Inserted {0} rows into {1}.'.format(counts[table], table))
+    return touched
+
+
+def row_load(db, files):
+    """Load the given CSV files with a handful of statements per row.
+    """
+    roster = Roster.load(db, META_DATA)
+    for f in files:
+        print('Reading {} ...'.format(f.parts[-1]))
+        course_info, headings, rows = stream_course(f)
+        layout = CourseLayout.compile(headings, course_info)
+        failed = set()
+
+        # Insert data
+        course_id = insert_course(db, headings, course_info)
+        obstacle_ids = insert_obstacles(db, layout, course_id)
+        runs = parse_runs(checked(rows, layout, f), layout)
+        if db.profile is not None:
+            runs = db.profile.iterate('parse', runs)
+        for run, row in runs:
+            _, ninja_id = insert_ninja(db, row, roster, course_info[2])
+            insert_obstacle_results(db, run, ninja_id, obstacle_ids, failed)
+            insert_course_result(db, run, course_id, ninja_id)
+        db.query_file(
+            'insert_manifest.sql',
+            file=str(f),
+            digest=file_digest(f),
+            id=course_id)
+
+
+def incremental_load(db, files, jobs=1):
+    """Load only the CSV files that were added or changed since the last build.
+
+    Courses whose files changed or were removed are deleted (along with their
+    obstacles and results) before the new versions are loaded with
+    `bulk_load`.
+
+    Returns:
+        Set[int]: The IDs of every competitor in an added, changed or removed
+                  file.
+    """
+    manifest = {
+        r.path: r
+        for r in db.query('SELECT path, digest, course_id FROM CsvManifest')
+    }
+    paths = {str(f): f for f in files}
+    changed = [
+        f for path, f in paths.items()
+        if path not in manifest or manifest[path].digest != file_digest(f)
+    ]
+
+    touched = set()
+    for path, entry in manifest.items():
+        if path not in paths or paths[path] in changed:
+            print('Removing {} ...'.format(pathlib.Path(path).parts[-1]))
+            touched.update(r.ninja_id for r in db.query_file(
+                'ninjas_by_course.sql', id=entry.course_id))
+            db.query_file('delete_course.sql', id=entry.course_id)
+    db.query_file('delete_orphans.sql')
+
+    touched.update(bulk_load(db, changed, jobs))
+    return touched
 
 
 if __name__ == '__main__':
-    # Reset the database and its tables.
-    db = records.Database()  # Defaults to $DATABASE_URL.
-    tx = db.transaction()
-    for table in TABLES:
-        db.query('DROP TABLE IF EXISTS {0} CASCADE;'.format(table))
-    db.query_file('data/sql/create_tables.sql')
-
-    for f in CSV_DATA.glob('**/*.csv'):
-        base = f.parts[-1]
-        course_info = base.strip('.csv').split('-')
-        print('Reading {} ...'.format(base))
-        with f.open('rU') as csv_file:
-            FAILED_IDS = []
-            reader = csv.reader(csv_file)
-            headings = next(reader)  # Skip the headings
-            rows = list(reader)
-
-            # Insert data
-            obstacles = (len(headings) - 4) / 2
-            course_id = insert_course(db, headings, course_info)
-            insert_obstacles(db, headings, course_info, course_id)
-            for i, row in enumerate(rows):
-                shown, ninja_id = insert_ninja(db, row)
-                insert_obstacle_results(db, row, ninja_id, course_id, shown,
-                                        headings)
-                insert_course_result(db, row, course_id, ninja_id, shown,
-                                     obstacles)
-
-    print('Inserting summaries ...')
-    insert_summary(db)
-
-    tx.commit()
+    parser = argparse.ArgumentParser(
+        description='Build the database from the CSV files in data/csv.')
+    parser.add_argument(
+        '--bulk',
+        action='store_true',
+        help='load each table with multi-row inserts instead of row by row')
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help=('only reload the CSV files that changed since the last build '
+              '(implies --bulk)'))
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help=('the number of worker processes to parse CSV files across '
+              '(with --bulk)'))
+    parser.add_argument(
+        '--database',
+        help=('the database URL, e.g. "sqlite:///ninjas.db" or "sqlite://" '
+              '(in memory); defaults to $DATABASE_URL'))
+    parser.add_argument(
+        '--export',
+        type=pathlib.Path,
+        help='write a read-only copy of the built SQLite database to EXPORT')
+    parser.add_argument(
+        '--bundle',
+        type=pathlib.Path,
+        help='export the built tables as memory-mappable .npy files to BUNDLE')
+    parser.add_argument(
+        '--similar',
+        type=pathlib.Path,
+        help=('write the similar-competitor index to SIMILAR (with '
+              '--incremental, only the changed competitors are updated)'))
+    parser.add_argument(
+        '--profiles',
+        type=pathlib.Path,
+        help=('write each competitor\'s profile document to PROFILES (with '
+              '--incremental, only the changed competitors are rewritten)'))
+    parser.add_argument(
+        '--profile',
+        type=pathlib.Path,
+        help=('write a JSON report of the time, calls, rows and round-trips '
+              'of each stage and SQL file to PROFILE'))
+    parser.add_argument(
+        '--cprofile',
+        type=pathlib.Path,
+        help=('dump cProfile statistics of this process (but not of --jobs '
+              'workers) to CPROFILE'))
+    parser.add_argument(
+        '--slow',
+        type=float,
+        help='log statements that take at least SLOW seconds to stderr')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        profiler.enable()
+    profile = instrument.Profile(args.slow)
+    db = connect(args.database)
+    if args.export and db.dialect != 'sqlite':
+        parser.error('--export needs a SQLite --database')
+    if args.profile or args.slow is not None:
+        db.profile = profile
+    files = list(CSV_DATA.glob('**/*.csv'))
+    # The build is all or nothing: the database is left as it was if any
+    # step fails.
+    with db.transaction():
+        exists = db.query_file('table_exists.sql', table='CsvManifest')
+        if args.incremental and exists[0].present:
+            # What the database was before `touched` changed.
+            since = source_digest(db)
+            with profile.stage('load'):
+                touched = incremental_load(db, files, args.jobs)
+            print('Updating {} summaries ...'.format(len(touched)))
+            with profile.stage('summary'):
+                insert_summary(db, touched)
+        else:
+            touched = since = None
+            # Reset the database and its tables.
+            with profile.stage('schema'):
+                db.query_file('drop_tables.sql')
+                db.query_file('create_tables.sql')
+
+            with profile.stage('load'):
+                if args.bulk or args.incremental:
+                    bulk_load(db, files, args.jobs)
+                else:
+                    # The row-by-row inserts look rows up as they go, so they
+                    # need the indexes from the start.
+                    db.query_file('create_indexes.sql')
+                    row_load(db, files)
+
+            print('Inserting summaries ...')
+            with profile.stage('summary'):
+                insert_summary(db)
+
+        print('Updating course statistics ...')
+        with profile.stage('stats'):
+            insert_stats(db)
+
+        # Indexes are built (or brought up to date) once the data is in.
+        print('Building indexes ...')
+        with profile.stage('index'):
+            db.query_file('create_indexes.sql')
+        with profile.stage('plans'):
+            for name, _, passed in check_plans(db):
+                if not passed:
+                    print('Warning: {0} does not use its index.'.format(name))
+
+    if args.export:
+        print('Exporting to {} ...'.format(args.export))
+        with profile.stage('export'):
+            db.export(args.export)
+    if args.bundle:
+        print('Writing the bundle to {} ...'.format(args.bundle))
+        with profile.stage('bundle'):
+            bundle.export(db, args.bundle)
+    if args.similar:
+        print('Writing the similarity index to {} ...'.format(args.similar))
+        with profile.stage('similar'):
+            similar.build(db, args.similar, touched, since)
+    if args.profiles:
+        print('Writing the profiles to {} ...'.format(args.profiles))
+        with profile.stage('profiles'):
+            profiles.build(db, args.profiles, touched, since)
+    db.close()
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(str(args.cprofile))
+    if args.profile:
+        profile.write(args.profile)
+        print('Wrote the profile to {}.'.format(args.profile))
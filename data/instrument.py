@@ -0,0 +1,156 @@
+"""instrument.py
+
+Collects where a build's time goes: the wall time of each pipeline stage and,
+for each SQL file (or inline statement), its wall time, call count, rows
+affected and database round-trips.
+
+A `Profile` is attached to a database with ``db.profile = Profile()``, after
+which every statement is reported to it (see `database.Database`). Stages are
+timed with `Profile.stage`:
+
+    profile = Profile(slow=0.5)
+    db.profile = profile
+    with profile.stage('load'):
+        ...
+    profile.write('report.json')
+"""
+import collections
+import contextlib
+import json
+import sys
+import time
+
+
+class Profile(object):
+    """Per-stage and per-statement timings.
+
+    Args:
+        slow (float): Statements that take at least this many seconds are
+                      logged to stderr as they finish (and listed in the
+                      report). None disables the log.
+    """
+
+    def __init__(self, slow=None):
+        self.slow = slow
+        self.start = time.perf_counter()
+        self.stages = collections.OrderedDict()
+        self.statements = {}
+        self.slow_statements = []
+
+    def _add_stage(self, name, seconds):
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the block as (another call of) the stage `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self._add_stage(name, time.perf_counter() - start)
+
+    def iterate(self, name, iterable):
+        """Pass `iterable` through, timing how long its items take to
+        produce as the stage `name`.
+
+        This separates a generator's work (e.g., parsing) from the work of
+        whatever consumes it (e.g., inserting).
+        """
+        items = iter(iterable)
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                yield item
+        finally:
+            self._add_stage(name, seconds)
+
+    def statement(self, label, seconds, rows, round_trips=1):
+        """Record a statement run by the database.
+
+        Args:
+            label (str): The SQL file or a summary of the statement.
+            rows (int): The rows returned or affected (-1 if unknown).
+            round_trips (int): The number of requests sent to the database.
+
+        Examples:
+            >>> profile = Profile()
+            >>> profile.statement('ninjas.sql', 0.5, 3)
+            >>> profile.statement('ninjas.sql', 0.25, 1, round_trips=2)
+            >>> s = profile.report()['statements']['ninjas.sql']
+            >>> s['calls'], s['seconds'], s['rows'], s['round_trips']
+            (2, 0.75, 4, 3)
+        """
+        entry = self.statements.get(label)
+        if entry is None:
+            entry = self.statements[label] = {
+                'calls': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'rows': 0,
+                'round_trips': 0
+            }
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        entry['rows'] += max(rows, 0)
+        entry['round_trips'] += round_trips
+
+        if self.slow is not None and seconds >= self.slow:
+            self.slow_statements.append({
+                'statement': label,
+                'seconds': round(seconds, 6),
+                'rows': rows
+            })
+            sys.stderr.write(
+                'Slow statement ({0:.3f}s, {1} rows): {2}\n'.format(
+                    seconds, rows, label))
+
+    def report(self):
+        """Summarize everything recorded so far.
+
+        Returns:
+            dict: The total wall time, the stages (in the order they first
+                  ran), the statements (slowest first) and their totals, and
+                  the slow statements.
+        """
+        statements = collections.OrderedDict()
+        for label, entry in sorted(
+                self.statements.items(), key=lambda i: -i[1]['seconds']):
+            entry = dict(entry)
+            entry['seconds'] = round(entry['seconds'], 6)
+            entry['max_seconds'] = round(entry['max_seconds'], 6)
+            statements[label] = entry
+        return collections.OrderedDict([
+            ('seconds', round(time.perf_counter() - self.start, 6)),
+            ('stages', collections.OrderedDict(
+                (name, {'seconds': round(s['seconds'], 6),
+                        'calls': s['calls']})
+                for name, s in self.stages.items())),
+            ('database', {
+                'seconds': round(
+                    sum(s['seconds'] for s in self.statements.values()), 6),
+                'calls': sum(s['calls'] for s in self.statements.values()),
+                'rows': sum(s['rows'] for s in self.statements.values()),
+                'round_trips': sum(
+                    s['round_trips'] for s in self.statements.values())
+            }),
+            ('statements', statements),
+            ('slow', self.slow_statements),
+        ])
+
+    def write(self, path):
+        """Write `report` to `path` as JSON.
+        """
+        with open(str(path), 'w') as f:
+            json.dump(self.report(), f, indent=2)
+            f.write('\n')
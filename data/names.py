@@ -0,0 +1,159 @@
+import collections
+import difflib
+import doctest
+import sys
+
+# Names are padded so that their first and last characters start and end a
+# trigram of their own.
+PAD = '\0\0'
+
+
+def trigrams(name):
+    """Count the (padded) trigrams in `name`.
+
+    Examples:
+        >>> grams = trigrams('Bob Bobo')
+        >>> grams['Bob'], grams['obo'], sum(grams.values())
+        (2, 1, 10)
+    """
+    padded = PAD + name + PAD
+    return collections.Counter(
+        padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class NameIndex(object):
+    """An index of competitor names that answers "close match" queries.
+
+    Matches are the names whose `difflib` ratio with the query is at least
+    `cutoff` (as `difflib.get_close_matches` finds them). Rather than
+    comparing the query against every name, we only compare it against names
+    that are close enough in length and share enough trigrams with it to
+    possibly reach `cutoff`.
+
+    Examples:
+        >>> index = NameIndex(['Jon Horton', 'Jon Alexis Sr.', 'Kevin Bull'])
+        >>> index.matches('Jon Hoton')
+        ['Jon Horton']
+        >>> index.matches('Jon Alexis Jr.')
+        ['Jon Alexis Sr.']
+        >>> index.matches('Kevin Bull')
+        []
+        >>> 'Kevin Bull' in index, len(index)
+        (True, 3)
+    """
+
+    def __init__(self, names=(), cutoff=0.9):
+        self.cutoff = cutoff
+        self._names = []
+        self._ids = {}
+        self._lengths = collections.defaultdict(list)
+        self._postings = collections.defaultdict(list)
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        """Add `name` to the index (names that are already indexed are
+        ignored).
+        """
+        if name in self._ids:
+            return
+        name_id = self._ids[name] = len(self._names)
+        self._names.append(name)
+        self._lengths[len(name)].append(name_id)
+        for gram, count in trigrams(name).items():
+            self._postings[gram].append((name_id, count))
+
+    def _min_shared(self, a, b):
+        """The fewest trigrams that names of length `a` and `b` can share if
+        their ratio reaches `cutoff`.
+
+        A ratio of at least `cutoff` means the names are at most
+        (1 - cutoff) * (a + b) edits apart, and each edit can destroy at most
+        3 trigrams.
+        """
+        edits = int((1 - self.cutoff) * (a + b) + 1e-9)
+        return max(a, b) + 2 - 3 * edits
+
+    def candidates(self, name):
+        """Find the indexed names that are close enough to `name` in length
+        and share enough trigrams with it that they might match.
+
+        Every name that `matches` can return is a candidate, and since the
+        bounds are symmetric, so is every name that might match `name` if it
+        were the query instead.
+
+        Returns:
+            Set[int]: The names' positions in the index.
+        """
+        size = len(name)
+        if self.cutoff > 0:
+            # 2 * min(a, b) / (a + b) bounds the ratio of two strings.
+            low = size * self.cutoff / (2 - self.cutoff)
+            high = size * (2 - self.cutoff) / self.cutoff
+        else:
+            low, high = 0, float('inf')
+
+        shared = collections.Counter()
+        for gram, count in trigrams(name).items():
+            for name_id, other in self._postings.get(gram, ()):
+                shared[name_id] += min(count, other)
+
+        candidates = set()
+        for name_id, count in shared.items():
+            length = len(self._names[name_id])
+            if (low - 1e-9 <= length <= high + 1e-9
+                    and count >= self._min_shared(size, length)):
+                candidates.add(name_id)
+        # Very short names can reach `cutoff` without sharing any trigrams.
+        longest = max(self._lengths, default=0)
+        for length in range(int(low), int(min(high, longest)) + 1):
+            if self._min_shared(size, length) <= 0:
+                candidates.update(self._lengths.get(length, ()))
+        return candidates
+
+    def name(self, name_id):
+        """Get the name at position `name_id` (see `candidates`).
+        """
+        return self._names[name_id]
+
+    def scored_matches(self, name):
+        """Like `matches`, but every match is returned along with its ratio.
+
+        Returns:
+            List[(float, str)]: (ratio, name), best match first.
+        """
+        # Score the candidates exactly like `difflib.get_close_matches`.
+        scored = []
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(name)
+        for name_id in self.candidates(name):
+            other = self._names[name_id]
+            if other == name:
+                continue
+            matcher.set_seq1(other)
+            if (matcher.real_quick_ratio() >= self.cutoff
+                    and matcher.quick_ratio() >= self.cutoff
+                    and matcher.ratio() >= self.cutoff):
+                scored.append((matcher.ratio(), other))
+        return sorted(scored, reverse=True)
+
+    def matches(self, name, n=3):
+        """Find the (at most `n`) indexed names that `name` could be a
+        misspelling of, best match first.
+
+        `name` itself is never included.
+        """
+        return [other for _, other in self.scored_matches(name)[:n]]
+
+
+if __name__ == '__main__':
+    # Run tests
+    failed, _ = doctest.testmod()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""plans.py
+
+Checks that the hot lookup queries can use the indexes in
+``create_indexes.sql``. On PostgreSQL, each query is run through ``EXPLAIN``
+with sequential scans and explicit sorts disabled, so the check passes
+whenever the planner *can* use the index (and its order), even on tables
+small enough that it would rather not. SQLite has no such settings, so its
+``EXPLAIN QUERY PLAN`` shows the plan it would actually use.
+
+Example:
+    From the root of the repository (checking $DATABASE_URL, unless a
+    database URL is given) ::
+
+        $ python data/plans.py sqlite:///ninjas.db
+        leaders.sql: obstacle_result_leaders_idx
+        ...
+"""
+import re
+import sys
+
+from database import connect
+
+# (SQL file, parameters, indexes that the plan should use any of).
+HOT_QUERIES = [
+    ('ninja_by_name.sql', {'f': 'Kevin', 'l': 'Bull'}, {'ninja_name_idx'}),
+    ('leaders.sql', {'obs_id': 1}, {'obstacle_result_leaders_idx'}),
+    ('results_by_ninja.sql', {'nid': 1}, {'course_result_ninja_idx'}),
+    ('ninjas_by_course.sql', {'id': 1}, {'course_result_course_idx'}),
+    ('ninjas.sql', {}, {'course_result_ninja_idx'}),
+    ('leaderboard.sql', {'obs_id': 1}, {'obstacle_leaderboard_place_idx'}),
+]
+
+
+def index_names(plan):
+    """Collect the name of every index used by an `EXPLAIN (FORMAT JSON)`
+    plan node and its children.
+
+    Examples:
+        >>> sorted(index_names({'Node Type': 'Nested Loop', 'Plans': [
+        ...     {'Node Type': 'Index Scan', 'Index Name': 'a_idx'},
+        ...     {'Node Type': 'Seq Scan'}]}))
+        ['a_idx']
+    """
+    names = set()
+    if 'Index Name' in plan:
+        names.add(plan['Index Name'])
+    for child in plan.get('Plans', ()):
+        names |= index_names(child)
+    return names
+
+
+def sqlite_index_names(details):
+    """Collect the name of every index used by the `detail` column of an
+    `EXPLAIN QUERY PLAN`.
+
+    Examples:
+        >>> sorted(sqlite_index_names([
+        ...     'SEARCH Ninja USING COVERING INDEX a_idx (first_name=?)',
+        ...     'SCAN Course', 'SEARCH Obstacle USING INDEX b_idx (id=?)']))
+        ['a_idx', 'b_idx']
+    """
+    names = set()
+    for detail in details:
+        names.update(re.findall(r'USING (?:COVERING )?INDEX (\w+)', detail))
+    return names
+
+
+def explain(db, name, params):
+    """Get the indexes used by the plan of the SQL file `name`.
+    """
+    if db.dialect == 'sqlite':
+        rows = db.query('EXPLAIN QUERY PLAN ' + db.sql[name], **params)
+        return sqlite_index_names(row.detail for row in rows)
+    rows = db.query('EXPLAIN (FORMAT JSON) ' + db.sql[name], **params)
+    return index_names(rows[0][0][0]['Plan'])
+
+
+def check_plans(db):
+    """EXPLAIN every query in `HOT_QUERIES`.
+
+    Returns:
+        List[(str, Set[str], bool)]: (SQL file, indexes used, whether one of
+                                     the expected indexes was used) for each
+                                     query.
+    """
+    settings = ['enable_seqscan', 'enable_sort']
+    if db.dialect == 'sqlite':
+        settings = []
+    results = []
+    for setting in settings:
+        db.query('SET {0} = off'.format(setting))
+    try:
+        for name, params, expected in HOT_QUERIES:
+            used = explain(db, name, params)
+            results.append((name, used, bool(used & expected)))
+    finally:
+        for setting in settings:
+            db.query('RESET {0}'.format(setting))
+    return results
+
+
+if __name__ == '__main__':
+    db = connect(sys.argv[1] if len(sys.argv) > 1 else None)
+    ok = True
+    for name, used, passed in check_plans(db):
+        ok &= passed
+        print('{0}: {1}{2}'.format(
+            name, ', '.join(sorted(used)) or 'no index',
+            '' if passed else ' (expected index unused)'))
+    sys.exit(0 if ok else 1)
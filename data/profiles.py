@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""profiles.py
+
+Precomputed profile documents, one per competitor, so that a competitor's
+page is a single keyed read instead of joins across Ninja, CareerSummary,
+CourseResult, Course, ObstacleResult, Obstacle and ObstacleLeaderboard.
+
+A profile is a JSON document like ::
+
+    {"ninja_id": 1, "first_name": "Kevin", "last_name": "Bull", ...,
+     "summary": {"best_finish": "...", "rating": 108.167, ...},
+     "courses": [{"course_id": 15, "city": "Venice", "category": "Finals",
+                  "season": 7, "size": 10,
+                  "runs": [{"duration": 81.0, "finish_point": 10,
+                            "completed": true}],
+                  "obstacles": [{"obstacle_id": 88, "title": "Log Grip",
+                                 "transition": 0.0, "duration": 14.85,
+                                 "completed": true, "place": 3,
+                                 "time": 14.85}, ...]}, ...]}
+
+where `summary` is null for a competitor without a CareerSummary, the
+courses are in the order they're run in (by season), and an obstacle's
+`place` and `time` are null if they're not on its leaderboard.
+
+`build` (the last stage of ``generate.py --profiles``) writes the documents
+to a directory of static files ::
+
+    meta.json           the format version, the id of the build and the
+                        database it was built from
+    names.json          "First Last" -> ninja_id
+    ninjas/<id>.json    each competitor's document
+
+Only the documents whose contents change are rewritten (each one by an
+atomic rename), and `meta.json` is written last. Its `build` changes
+whenever any document does, which is what `ProfileStore` (the read side)
+watches to know when to drop its cache.
+
+Example:
+    From the root of the repository ::
+
+        $ python data/generate.py --bulk --profiles build/profiles
+        $ python data/profiles.py build/profiles "Kevin Bull"
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import pathlib
+
+from database import connect, source_digest
+from util import TYPE_2_INT
+
+# The version of the directory's layout and of the documents' format.
+VERSION = 1
+META = 'meta.json'
+NAMES = 'names.json'
+DOCUMENTS = 'ninjas'
+
+NINJA_FIELDS = ('ninja_id', 'first_name', 'last_name', 'sex', 'age',
+                'occupation', 'instagram', 'twitter')
+SUMMARY_FIELDS = ('best_finish', 'speed', 'success', 'consistency', 'rating',
+                  'seasons', 'qualifying', 'finals', 'stages')
+COURSE_FIELDS = ('course_id', 'city', 'category', 'season', 'size')
+RUN_FIELDS = ('duration', 'finish_point', 'completed')
+OBSTACLE_FIELDS = ('obstacle_id', 'title', 'transition', 'duration',
+                   'completed', 'place', 'time')
+# Decimal columns, which are stored as JSON numbers.
+DECIMALS = {
+    'speed', 'success', 'consistency', 'rating', 'duration', 'transition',
+    'time'
+}
+# Boolean columns (which SQLite returns as 0 or 1).
+BOOLEANS = {'completed'}
+
+
+def pick(row, fields):
+    """Copy `fields` of the database `row` into a document.
+
+    Examples:
+        >>> import decimal
+        >>> Row = collections.namedtuple('Row', 'title duration completed')
+        >>> list(pick(Row('Log Grip', decimal.Decimal('14.85'), 1),
+        ...           ('title', 'duration', 'completed')).items())
+        [('title', 'Log Grip'), ('duration', 14.85), ('completed', True)]
+    """
+    doc = collections.OrderedDict()
+    for field in fields:
+        value = getattr(row, field)
+        if field in DECIMALS and value is not None:
+            value = float(value)
+        elif field in BOOLEANS:
+            value = bool(value)
+        doc[field] = value
+    return doc
+
+
+def documents(db, ninja_ids):
+    """Assemble the profiles of the competitors with the given IDs (that are
+    still in the Ninja table).
+
+    Returns:
+        Dict[int, OrderedDict]: Each competitor's document, by ninja_id.
+    """
+    ids = sorted(ninja_ids)
+    docs = collections.OrderedDict()
+    for row in db.query_file('profiles_by_ninja.sql', ids=ids):
+        doc = pick(row, NINJA_FIELDS)
+        doc['summary'] = (None if row.best_finish is None else
+                          pick(row, SUMMARY_FIELDS))
+        doc['courses'] = []
+        docs[row.ninja_id] = doc
+
+    courses = {}
+    for row in db.query_file('courses_by_ninja.sql', ids=ids):
+        key = (row.ninja_id, row.course_id)
+        if key not in courses:
+            courses[key] = pick(row, COURSE_FIELDS)
+            courses[key]['runs'] = []
+            courses[key]['obstacles'] = []
+            docs[row.ninja_id]['courses'].append(courses[key])
+        courses[key]['runs'].append(pick(row, RUN_FIELDS))
+    for row in db.query_file('obstacles_by_ninja.sql', ids=ids):
+        courses[row.ninja_id, row.course_id]['obstacles'].append(
+            pick(row, OBSTACLE_FIELDS))
+    # Course IDs change when a course is reloaded, so they can't order them.
+    for doc in docs.values():
+        doc['courses'].sort(key=lambda c: (c['season'], TYPE_2_INT.get(
+            c['category'], 0), c['city']))
+    return docs
+
+
+def encode(doc):
+    """Serialize a document the way `build` writes it.
+
+    Examples:
+        >>> encode({'ninja_id': 1, 'summary': None})
+        b'{"ninja_id":1,"summary":null}'
+    """
+    return json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+
+def write_file(path, data):
+    """Replace the file at `path` with `data`, unless it already holds it.
+
+    The new contents are renamed into place, so readers see either the old
+    file or the new one.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    temp = path.with_name(path.name + '.tmp')
+    temp.write_bytes(data)
+    os.replace(str(temp), str(path))
+    return True
+
+
+def build(db, root, ninja_ids=None, since=None):
+    """Write the profiles to the directory `root`, or update them if they're
+    already there.
+
+    Only the documents of `ninja_ids` (and of any competitor without one)
+    are assembled again, as long as the profiles were built from the
+    database as it was before `ninja_ids` changed (`since`). Otherwise,
+    every document is.
+
+    Args:
+        ninja_ids (Set[int]): The competitors whose results changed, or None
+                              to (re)write every document.
+        since (str): The `database.source_digest` of the database before
+                     `ninja_ids` changed.
+
+    Returns:
+        int: The number of documents written or removed.
+    """
+    root = pathlib.Path(root)
+    (root / DOCUMENTS).mkdir(parents=True, exist_ok=True)
+    try:
+        with (root / META).open() as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        meta = None
+    if meta is None or meta['version'] != VERSION:
+        meta = {'version': VERSION, 'build': '', 'ninjas': 0}
+    if since is None or meta.get('source') != since:
+        ninja_ids = None
+
+    ninjas = db.query(
+        'SELECT ninja_id, first_name, last_name FROM Ninja ORDER BY ninja_id')
+    existing = {path.name for path in (root / DOCUMENTS).iterdir()}
+    if ninja_ids is None:
+        ninja_ids = [row.ninja_id for row in ninjas]
+    else:
+        ninja_ids = set(ninja_ids) | {
+            row.ninja_id for row in ninjas
+            if '{0}.json'.format(row.ninja_id) not in existing
+        }
+
+    # The new build id chains every change onto the last one.
+    build_hash = hashlib.sha256(meta['build'].encode('ascii'))
+    changes = 0
+    for ninja_id, doc in documents(db, ninja_ids).items():
+        data = encode(doc)
+        if write_file(root / DOCUMENTS / '{0}.json'.format(ninja_id), data):
+            build_hash.update(data)
+            changes += 1
+    current = {'{0}.json'.format(row.ninja_id) for row in ninjas}
+    for name in sorted(existing - current):
+        (root / DOCUMENTS / name).unlink()
+        build_hash.update(name.encode('utf-8'))
+        changes += 1
+
+    names = collections.OrderedDict()
+    for row in ninjas:
+        names.setdefault('{0} {1}'.format(row.first_name, row.last_name),
+                         row.ninja_id)
+    if write_file(root / NAMES, encode(names)):
+        build_hash.update(b'names')
+        changes += 1
+
+    if changes or not meta['build']:
+        meta['build'] = build_hash.hexdigest()
+    meta['ninjas'] = len(ninjas)
+    meta['source'] = source_digest(db)
+    write_file(root / META, json.dumps(meta, indent=2).encode('utf-8'))
+    return changes
+
+
+class ProfileStore(object):
+    """Serves the profiles in `root` (see `build`) through an LRU cache of
+    the `size` most recently read documents.
+
+    Every read checks whether `meta.json` has been replaced (by its mtime
+    and size), and if the build it names is a new one, the cache is dropped,
+    so nothing is served from an older build than the files on disk.
+
+    The documents are shared between callers, so they shouldn't be modified.
+
+    Examples:
+        >>> import tempfile
+        >>> root = pathlib.Path(tempfile.mkdtemp())
+        >>> (root / DOCUMENTS).mkdir()
+        >>> _ = write_file(root / DOCUMENTS / '1.json', b'{"ninja_id":1}')
+        >>> _ = write_file(root / NAMES, b'{"Kevin Bull":1}')
+        >>> _ = write_file(root / META, b'{"version":1,"build":"a"}')
+        >>> store = ProfileStore(root, size=1)
+        >>> store.get(1), store.find('Kevin Bull'), store.get(2)
+        ({'ninja_id': 1}, {'ninja_id': 1}, None)
+        >>> store.hits, store.misses
+        (1, 2)
+        >>> _ = write_file(root / META, b'{"version":1,"build":"b2"}')
+        >>> store.get(1), store.build, store.misses
+        ({'ninja_id': 1}, 'b2', 3)
+    """
+
+    def __init__(self, root, size=1024):
+        self.root = pathlib.Path(root)
+        self.size = size
+        self.build = None
+        self.hits = 0
+        self.misses = 0
+        self._stamp = None
+        self._names = None
+        self._cache = collections.OrderedDict()
+
+    def refresh(self):
+        """Drop the cache if the profiles have been rebuilt since it was
+        filled.
+
+        Raises:
+            ValueError: If the profiles were written in another format.
+        """
+        stat = os.stat(str(self.root / META))
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with (self.root / META).open() as f:
+            meta = json.load(f)
+        if meta['version'] != VERSION:
+            raise ValueError('{0} holds version {1} profiles (expected {2})'.
+                             format(self.root, meta['version'], VERSION))
+        if meta['build'] != self.build:
+            self._cache.clear()
+            self._names = None
+            self.build = meta['build']
+        self._stamp = stamp
+
+    def get(self, ninja_id):
+        """Get the profile of the competitor with the given ID.
+
+        Returns:
+            dict: The document, or None if there's no such competitor.
+        """
+        self.refresh()
+        if ninja_id in self._cache:
+            self._cache.move_to_end(ninja_id)
+            self.hits += 1
+            return self._cache[ninja_id]
+        self.misses += 1
+        path = self.root / DOCUMENTS / '{0}.json'.format(int(ninja_id))
+        try:
+            with path.open('rb') as f:
+                doc = json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+        self._cache[ninja_id] = doc
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return doc
+
+    def find(self, name):
+        """Get the profile of the competitor called `name` (e.g., "Kevin
+        Bull"), or None.
+        """
+        self.refresh()
+        if self._names is None:
+            with (self.root / NAMES).open() as f:
+                self._names = json.load(f)
+        ninja_id = self._names.get(name)
+        return None if ninja_id is None else self.get(ninja_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print a competitor\'s profile document.')
+    parser.add_argument(
+        'root', type=pathlib.Path, help='the profiles directory')
+    parser.add_argument('name', help='the competitor, e.g. "Kevin Bull"')
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='(re)write the profiles from the database first')
+    parser.add_argument(
+        '--database', help='the database URL; defaults to $DATABASE_URL')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        db = connect(args.database)
+        build(db, args.root)
+        db.close()
+    doc = ProfileStore(args.root).find(args.name)
+    if doc is None:
+        parser.error('No competitor named {0}'.format(args.name))
+    print(json.dumps(doc, indent=2))
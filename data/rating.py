@@ -0,0 +1,148 @@
+"""rating.py
+
+Computes every competitor's CareerSummary (their best finish, speed, success
+and consistency scores, and Ninja Rating) in one batched NumPy pass over the
+course results and obstacle placings.
+
+For each competitor, over every course result:
+
+    point       = the course's size if it was completed, else finish_point - 1
+    best        = the furthest run, as TYPE_2_INT + 0.1 * point
+    speed       = 3 * (# obstacles placed on) - (mean place, 0 if unplaced)
+    success     = 4 * max over categories of sum(TYPE_2_INT + point)
+    consistency = sum(point) * (# seasons)
+    rating      = speed + success + consistency
+"""
+import numpy as np
+
+from util import FINISH_2_NAME, TYPE_2_INT
+
+# The number of categories that results are bucketed into (Qualifying,
+# Finals and Stages 1 - 4).
+N_TYPES = len(TYPE_2_INT) - 1
+
+
+def group_sums(keys, values, lookup):
+    """Sum `values` by `keys` and look up the sum for each key in `lookup`.
+
+    Keys that don't appear in `keys` sum to 0.
+
+    Examples:
+        >>> group_sums(np.array([3, 1, 3]), np.array([1, 2, 4]),
+        ...            np.array([1, 2, 3])).tolist()
+        [2, 0, 5]
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=len(unique))
+    idx = np.searchsorted(unique, lookup)
+    found = idx < len(unique)
+    found[found] = unique[idx[found]] == lookup[found]
+    out = np.zeros(len(lookup), sums.dtype)
+    out[found] = sums[idx[found]]
+    return out.astype(np.asarray(values).dtype)
+
+
+def summarize(ninja_ids, results, placings, obstacles):
+    """Compute the CareerSummary of every competitor in `ninja_ids`.
+
+    Args:
+        ninja_ids (np.ndarray): The competitors to summarize.
+        results (dict): Course results as arrays: `ninja_id`, `course_id`,
+                        `category`, `season`, `completed`, `size` and
+                        `finish_point`. They're accumulated in order.
+        placings (dict): Obstacle leaderboard places as arrays: `obstacle_id`,
+                         `ninja_id` and `place` (see `placings.sql`).
+        obstacles (dict): Obstacles as arrays: `obstacle_id` and `course_id`.
+
+    Returns:
+        dict: Arrays aligned with `ninja_ids`: `best` (a list of best finish
+              names), `speed`, `success`, `consistency`, `rating`, `seasons`,
+              `qualifying`, `finals` and `stages`.
+
+    Examples:
+        >>> empty = np.array([])
+        >>> summary = summarize(
+        ...     [1, 2], dict.fromkeys(['ninja_id', 'course_id', 'category',
+        ...                            'season', 'completed', 'size',
+        ...                            'finish_point'], empty),
+        ...     dict.fromkeys(['obstacle_id', 'ninja_id', 'place'], empty),
+        ...     dict.fromkeys(['obstacle_id', 'course_id'], empty))
+        >>> summary['best'], summary['rating'], summary['stages']
+        ([None, None], [0.0, 0.0], [0, 0])
+    """
+    ninja_ids = np.asarray(ninja_ids, np.int64)
+    n = len(ninja_ids)
+
+    # Map every result to its competitor's position in `ninja_ids`, dropping
+    # the results of anyone else.
+    keep = np.isin(results['ninja_id'], ninja_ids)
+    r = {k: np.asarray(v)[keep] for k, v in results.items()}
+    # An empty column has no values to infer an integer dtype from.
+    for k in ('ninja_id', 'course_id', 'season', 'size', 'finish_point'):
+        r[k] = r[k].astype(np.int64)
+    placings = {k: np.asarray(v, np.int64) for k, v in placings.items()}
+    obstacles = {k: np.asarray(v, np.int64) for k, v in obstacles.items()}
+    order = np.argsort(ninja_ids)
+    who = order[np.searchsorted(ninja_ids[order], r['ninja_id'])]
+
+    int_type = np.array([TYPE_2_INT[c] for c in r['category']], np.int64)
+    type_idx = int_type // 2 - 1
+    completed = r['completed'].astype(bool)
+    point = np.where(completed, r['size'], r['finish_point'] - 1)
+    point = point.astype(np.int64)
+
+    cell = who * N_TYPES + type_idx
+    completes = np.bincount(
+        cell[completed], minlength=n * N_TYPES).reshape(n, N_TYPES)
+    # A competitor's best finish is their furthest single run, so it's
+    # always one of the names in FINISH_2_NAME.
+    finishes = np.zeros(n)
+    np.maximum.at(finishes, who, np.round(int_type + 0.1 * point, 1))
+    finish_scores = np.bincount(
+        cell, weights=int_type + point, minlength=n * N_TYPES).reshape(
+            n, N_TYPES).astype(np.int64)
+
+    pairs = np.unique(np.stack([who, r['season'].astype(np.int64)]), axis=1)
+    seasons = np.bincount(pairs[0], minlength=n)
+    total = np.bincount(who, weights=point, minlength=n).astype(np.int64)
+
+    # Every result contributes one place (0 if they aren't on the
+    # leaderboard) per obstacle on its course.
+    width = int(max(np.max(obstacles['course_id'], initial=0),
+                    np.max(r['course_id'], initial=0))) + 1
+    sizes = np.bincount(obstacles['course_id'], minlength=width)
+    place_course = np.zeros(
+        int(np.max(obstacles['obstacle_id'], initial=0)) + 1, np.int64)
+    place_course[obstacles['obstacle_id']] = obstacles['course_id']
+    place_keys = (np.asarray(placings['ninja_id'], np.int64) * width +
+                  place_course[placings['obstacle_id']])
+    result_keys = r['ninja_id'].astype(np.int64) * width + r['course_id']
+    place_sum = group_sums(place_keys, np.asarray(placings['place'],
+                                                  np.int64), result_keys)
+    placed = group_sums(place_keys, np.ones(len(place_keys), np.int64),
+                        result_keys)
+
+    n_places = np.bincount(who, weights=sizes[r['course_id']], minlength=n)
+    n_placed = np.bincount(who, weights=placed, minlength=n)
+    sum_places = np.bincount(who, weights=place_sum, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n_places > 0, sum_places / n_places, 0)
+
+    speed = [round(x, 3) for x in (3 * n_placed - mean).tolist()]
+    success = 4 * finish_scores.max(axis=1, initial=0)
+    consistency = total * seasons
+    rating = [
+        round(s + a + c, 3)
+        for s, a, c in zip(speed, success.tolist(), consistency.tolist())
+    ]
+    return {
+        'best': [FINISH_2_NAME.get(x) for x in finishes.tolist()],
+        'speed': speed,
+        'success': success.tolist(),
+        'consistency': consistency.tolist(),
+        'rating': rating,
+        'seasons': seasons.tolist(),
+        'qualifying': completes[:, 0].tolist(),
+        'finals': completes[:, 1].tolist(),
+        'stages': completes[:, 2].tolist()
+    }
@@ -0,0 +1,117 @@
+import collections
+import doctest
+import json
+import sys
+
+# The number of years that two estimates of a competitor's birth year (their
+# season minus their age) may differ by. Ages are hand-collected, so they're
+# sometimes off by a year or two.
+AGE_TOLERANCE = 3
+
+
+def clean_sex(sex):
+    """Normalize a sex read from a CSV file or the Ninja table, where a blank
+    one may be padded to " " (by PostgreSQL's char(1)).
+
+    Examples:
+        >>> clean_sex(' '), clean_sex(None), clean_sex('M ')
+        (None, None, 'M')
+    """
+    return (sex or '').strip() or None
+
+
+def birth_year(age, season):
+    """Estimate a competitor's birth year (in seasons) from their age.
+
+    Examples:
+        >>> birth_year('30', '7')
+        -23
+        >>> birth_year(None, '7') is None
+        True
+    """
+    try:
+        return int(season) - int(age)
+    except (TypeError, ValueError):
+        return None
+
+
+class Roster(object):
+    """Resolves competitors to Ninja IDs for the duration of a build.
+
+    Competitors are identified by their first and last name. Two entries with
+    the same name are only considered different competitors if they disagree
+    on sex or if their ages put them more than `AGE_TOLERANCE` years apart.
+    Missing sexes and ages match anything.
+
+    Examples:
+        >>> roster = Roster()
+        >>> roster.add(1, 'Jon', 'Horton', 'M', '30', '7')
+        >>> roster.find('Jon', 'Horton', '', None, '8')
+        1
+        >>> roster.find('Jon', 'Horton', 'M', '31', '8')
+        1
+        >>> roster.find('Jon', 'Horton', 'M', '55', '8') is None
+        True
+        >>> roster.find('Jon', 'Horton', 'F', '30', '7') is None
+        True
+        >>> roster.add(2, 'Lorin', 'Ball', ' ', None, '7')
+        >>> roster.find('Lorin', 'Ball', 'M', '28', '7')
+        2
+    """
+
+    def __init__(self, meta=None):
+        self.meta = meta or {}
+        self._ninjas = collections.defaultdict(list)
+
+    @classmethod
+    def load(cls, db, meta_path):
+        """Create a roster of every competitor in the Ninja table.
+
+        Args:
+            meta_path (pathlib.Path): The path to `meta.json`.
+        """
+        with meta_path.open() as meta:
+            roster = cls(json.load(meta))
+        for r in db.query_file('ninjas.sql'):
+            roster.add(r.ninja_id, r.first_name, r.last_name, r.sex, r.age,
+                       r.season)
+        return roster
+
+    def add(self, ninja_id, first, last, sex, age, season):
+        """Record that the given competitor has the ID `ninja_id`.
+        """
+        self._ninjas[(first, last)].append(
+            [ninja_id, clean_sex(sex), birth_year(age, season)])
+
+    def find(self, first, last, sex, age, season):
+        """Find the ID of the given competitor.
+
+        Returns:
+            int: The competitor's ID or None if we haven't seen them before.
+        """
+        sex = clean_sex(sex)
+        born = birth_year(age, season)
+        for entry in self._ninjas.get((first, last), ()):
+            ninja_id, known_sex, known_born = entry
+            if sex and known_sex and sex != known_sex:
+                continue
+            elif born is not None and known_born is not None and abs(
+                    born - known_born) > AGE_TOLERANCE:
+                continue
+            # Fill in whatever we didn't know about them.
+            entry[1] = known_sex or sex
+            entry[2] = born if known_born is None else known_born
+            return ninja_id
+        return None
+
+    def info(self, first, last):
+        """Get the competitor's entry in `meta.json` (or an empty dict).
+        """
+        return self.meta.get('{0} {1}'.format(first, last), {})
+
+
+if __name__ == '__main__':
+    # Run tests
+    failed, _ = doctest.testmod()
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""similar.py
+
+An index of competitors by how they run, for "ninjas who run like this one"
+and "closest rival on this obstacle" lookups.
+
+Each competitor is described by a fixed-length vector with four features for
+each category of course (Qualifying, Finals and Stages 1 - 4):
+
+    pace        = mean log(split / the obstacle's median split), over the
+                  obstacles they completed (see ObstacleStats)
+    transition  = mean transition time
+    clear       = the fraction of attempted obstacles they completed
+    reach       = mean fraction of the course they got through
+
+Every feature is standardized across competitors, and a competitor without
+any results for a feature sits at its mean (0). Neighbors are the nearest
+vectors by Euclidean distance, found by a vectorized brute-force search or,
+for large rosters, a ball tree (if scikit-learn is installed).
+
+The per-competitor sums and counts behind the features are kept with the
+vectors, so when courses change only the competitors who ran them need to
+be fetched again (see `SimilarityIndex.update`).
+
+Example:
+    From the root of the repository ::
+
+        $ python data/generate.py --bulk --similar build/similar
+        $ python data/similar.py build/similar "Kevin Bull"
+"""
+import argparse
+import json
+import pathlib
+
+import numpy as np
+
+from database import connect, source_digest
+from dataset import CATEGORIES
+from stats import to_float
+from util import TYPE_2_INT
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # Only needed for large rosters.
+    BallTree = None
+
+VERSION = 1
+META = 'meta.json'
+METRICS = ('pace', 'transition', 'clear', 'reach')
+FEATURES = [
+    '{0} {1}'.format(category, metric) for category in CATEGORIES
+    for metric in METRICS
+]
+# Rosters at least this large are searched with a ball tree (if available).
+BALL_TREE_SIZE = 20000
+
+
+def feature_sums(ninja_ids, splits, finishes):
+    """Add up each competitor's features (see the module's docstring).
+
+    Args:
+        ninja_ids (np.ndarray): The competitors, sorted.
+        splits (dict): Obstacle results as arrays (see `splits_by_ninja.sql`).
+        finishes (dict): Course results as arrays (see
+                         `finishes_by_ninja.sql`).
+
+    Returns:
+        (np.ndarray, np.ndarray): (the sum and the count behind each feature
+                                  of each competitor).
+
+    Examples:
+        >>> sums, counts = feature_sums(
+        ...     np.array([7]),
+        ...     {'ninja_id': np.array([7, 7]),
+        ...      'category': np.array(['Qualifying', 'Qualifying']),
+        ...      'duration': np.array([5.0, 0.0]),
+        ...      'transition': np.array([0.0, 4.0]),
+        ...      'completed': np.array([True, False]),
+        ...      'p50_split': np.array([5.0, 2.0])},
+        ...     {'ninja_id': np.array([7]),
+        ...      'category': np.array(['Qualifying']),
+        ...      'finish_point': np.array([2]),
+        ...      'completed': np.array([False]),
+        ...      'size': np.array([6])})
+        >>> sums[0, :4].round(3).tolist(), counts[0, :4].tolist()
+        ([0.0, 4.0, 1.0, 0.167], [1, 1, 2, 1])
+    """
+    n = len(ninja_ids)
+    width = len(FEATURES)
+    cells = []
+    values = []
+
+    def add(results, metric, mask, value):
+        who = np.searchsorted(ninja_ids, results['ninja_id'][mask])
+        types = np.array(
+            [TYPE_2_INT[c] // 2 - 1 for c in results['category'][mask]],
+            np.int64)
+        cells.append(who * width + types * len(METRICS) +
+                     METRICS.index(metric))
+        values.append(value)
+
+    completed = splits['completed'].astype(bool)
+    duration = to_float(splits['duration'])
+    median = to_float(splits['p50_split'])
+    paced = completed & (duration > 0) & (median > 0)
+    add(splits, 'pace', paced, np.log(duration[paced] / median[paced]))
+    transition = to_float(splits['transition'])
+    moved = transition > 0
+    add(splits, 'transition', moved, transition[moved])
+    add(splits, 'clear', np.ones(len(completed), bool),
+        completed.astype(float))
+
+    done = finishes['completed'].astype(bool)
+    size = finishes['size'].astype(float)
+    point = np.where(done, size, finishes['finish_point'] - 1.0)
+    sized = size > 0
+    add(finishes, 'reach', sized, point[sized] / size[sized])
+
+    cells = np.concatenate(cells).astype(np.int64)
+    sums = np.bincount(cells, np.concatenate(values), minlength=n * width)
+    counts = np.bincount(cells, minlength=n * width)
+    return sums.reshape(n, width), counts.reshape(n, width)
+
+
+def fetch(db, ninja_ids):
+    """Fetch the results behind the features of `ninja_ids` (sorted).
+
+    Returns:
+        (np.ndarray, np.ndarray): See `feature_sums`.
+    """
+    ids = [int(i) for i in ninja_ids]
+
+    def arrays(query, columns):
+        rows = db.query_file(query, ids=ids)
+        return {c: np.array([getattr(r, c) for r in rows]) for c in columns}
+
+    return feature_sums(
+        np.asarray(ninja_ids, np.int64),
+        arrays('splits_by_ninja.sql', [
+            'ninja_id', 'category', 'duration', 'transition', 'completed',
+            'p50_split'
+        ]),
+        arrays('finishes_by_ninja.sql',
+               ['ninja_id', 'category', 'finish_point', 'completed', 'size']))
+
+
+def standardize(sums, counts):
+    """Turn feature sums and counts into standardized vectors.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): (the vectors, and the mean and
+                                              standard deviation of each
+                                              feature).
+
+    Examples:
+        >>> vectors, mean, std = standardize(np.array([[2.0], [4.0], [0.0]]),
+        ...                                  np.array([[1], [1], [0]]))
+        >>> vectors.ravel().tolist(), mean.tolist(), std.tolist()
+        ([-1.0, 1.0, 0.0], [3.0], [1.0])
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw = np.where(counts > 0, sums / counts, np.nan)
+    known = counts > 0
+    n = np.maximum(known.sum(axis=0), 1)
+    mean = np.where(known, raw, 0.0).sum(axis=0) / n
+    std = np.sqrt(np.where(known, (raw - mean)**2, 0.0).sum(axis=0) / n)
+    std[std == 0] = 1.0
+    vectors = np.where(known, (raw - mean) / std, 0.0)
+    return vectors.astype(np.float32), mean, std
+
+
+class SimilarityIndex(object):
+    """Competitors' feature vectors, with nearest-neighbor search.
+
+    Args:
+        ninja_ids (np.ndarray): The competitors, sorted.
+        sums, counts (np.ndarray): Their feature sums and counts (see
+                                   `feature_sums`).
+    """
+
+    def __init__(self, ninja_ids, sums, counts):
+        self.ninja_ids = np.asarray(ninja_ids, np.int64)
+        self.sums = np.asarray(sums, np.float64)
+        self.counts = np.asarray(counts, np.int64)
+        self.vectors, self.mean, self.std = standardize(
+            self.sums, self.counts)
+        self._norms = (self.vectors.astype(np.float64)**2).sum(axis=1)
+        self._tree = None
+        # The database the index was built from (see `database.source_digest`).
+        self.source = None
+
+    @classmethod
+    def build(cls, db):
+        """Build an index of every competitor in the database.
+        """
+        ninja_ids = np.array(
+            [r.ninja_id for r in db.query('SELECT ninja_id FROM Ninja')],
+            np.int64)
+        ninja_ids.sort()
+        return cls(ninja_ids, *fetch(db, ninja_ids))
+
+    def update(self, db, ninja_ids):
+        """Refetch the features of `ninja_ids`, which ran on courses that
+        were added, changed or removed.
+
+        Competitors who are no longer in the database are dropped.
+
+        Returns:
+            SimilarityIndex: The updated index.
+        """
+        ids = sorted(ninja_ids)
+        present = np.array(
+            [r.ninja_id for r in db.query_file('ninjas_by_id.sql', ids=ids)],
+            np.int64)
+        keep = ~np.isin(self.ninja_ids, ids)
+        sums, counts = fetch(db, present)
+        merged = np.concatenate([self.ninja_ids[keep], present])
+        order = np.argsort(merged, kind='mergesort')
+        return SimilarityIndex(
+            merged[order],
+            np.concatenate([self.sums[keep], sums])[order],
+            np.concatenate([self.counts[keep], counts])[order])
+
+    def vector(self, ninja_id):
+        """Get a competitor's vector.
+
+        Raises:
+            KeyError: If `ninja_id` isn't in the index.
+        """
+        i = np.searchsorted(self.ninja_ids, ninja_id)
+        if i == len(self.ninja_ids) or self.ninja_ids[i] != ninja_id:
+            raise KeyError(ninja_id)
+        return self.vectors[i]
+
+    def query(self, vector, k=5, among=None):
+        """Find the `k` competitors whose vectors are nearest to `vector`.
+
+        Args:
+            among (Iterable[int]): Only consider these competitors.
+
+        Returns:
+            List[(int, float)]: (ninja_id, distance), nearest first (and by
+                                ninja_id among ties).
+        """
+        vector = np.asarray(vector, np.float64)
+        if among is None:
+            candidates = np.arange(len(self.ninja_ids))
+            if len(candidates) >= BALL_TREE_SIZE and BallTree is not None:
+                return self._tree_query(vector, k)
+        else:
+            candidates = np.flatnonzero(np.isin(self.ninja_ids, list(among)))
+        # |a - b|^2 = |a|^2 - 2 a.b + |b|^2, with one product for everyone.
+        distances = (self._norms[candidates] -
+                     2 * self.vectors[candidates].dot(vector) +
+                     vector.dot(vector))
+        distances = np.sqrt(np.maximum(distances, 0))
+        if k < len(candidates):
+            nearest = np.argpartition(distances, k)[:k + 1]
+            cutoff = np.sort(distances[nearest])[k - 1]
+            nearest = np.flatnonzero(distances <= cutoff)
+        else:
+            nearest = np.arange(len(candidates))
+        order = np.lexsort((self.ninja_ids[candidates[nearest]],
+                            distances[nearest]))[:k]
+        return [(int(self.ninja_ids[candidates[nearest[i]]]),
+                 float(distances[nearest[i]])) for i in order]
+
+    def _tree_query(self, vector, k):
+        if self._tree is None:
+            self._tree = BallTree(self.vectors)
+        distances, idx = self._tree.query(vector[np.newaxis], k=k)
+        return [(int(self.ninja_ids[i]), float(d))
+                for d, i in zip(distances[0], idx[0])]
+
+    def neighbors(self, ninja_id, k=5, among=None):
+        """Find the `k` competitors who run most like `ninja_id`.
+
+        Examples:
+            >>> index = SimilarityIndex(
+            ...     [1, 2, 3, 4],
+            ...     np.array([[1.0] * 24, [1.1] * 24, [3.0] * 24, [0.0] * 24]),
+            ...     np.ones((4, 24), np.int64))
+            >>> [n for n, _ in index.neighbors(1, k=2)]
+            [2, 4]
+            >>> [n for n, _ in index.neighbors(1, k=1, among=[3, 4])]
+            [4]
+        """
+        vector = self.vector(ninja_id)
+        if among is not None:
+            among = set(among) - {ninja_id}
+        found = self.query(vector, k + 1, among)
+        return [(n, d) for n, d in found if n != ninja_id][:k]
+
+    def save(self, root):
+        """Write the index to the directory `root`.
+        """
+        root = pathlib.Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        for name in ('ninja_ids', 'sums', 'counts', 'vectors'):
+            np.save(str(root / (name + '.npy')), getattr(self, name))
+        # The metadata goes last, so an index with it is complete.
+        with (root / META).open('w') as f:
+            json.dump({
+                'version': VERSION,
+                'features': FEATURES,
+                'ninjas': len(self.ninja_ids),
+                'source': self.source
+            }, f, indent=2)
+
+
+def load(root):
+    """Open the index saved in `root` (see `SimilarityIndex.save`).
+
+    Raises:
+        ValueError: If it was saved by an incompatible version.
+    """
+    root = pathlib.Path(root)
+    with (root / META).open() as f:
+        meta = json.load(f)
+    if meta['version'] != VERSION or meta['features'] != FEATURES:
+        raise ValueError('{0} is an incompatible index'.format(root))
+    index = SimilarityIndex(*(np.load(str(root / (name + '.npy')))
+                              for name in ('ninja_ids', 'sums', 'counts')))
+    index.source = meta.get('source')
+    return index
+
+
+def build(db, root, ninja_ids=None, since=None):
+    """Build the index in `root`, or update it if it's already there.
+
+    An existing index is only updated if it was built from the database as
+    it was before `ninja_ids` changed (`since`); otherwise, other builds
+    have changed the database since, and the whole index is rebuilt.
+
+    Args:
+        ninja_ids (Set[int]): The competitors whose results changed, or None
+                              to rebuild the whole index.
+        since (str): The `database.source_digest` of the database before
+                     `ninja_ids` changed.
+
+    Returns:
+        SimilarityIndex: The saved index.
+    """
+    index = None
+    if ninja_ids is not None and (pathlib.Path(root) / META).exists():
+        try:
+            last = load(root)
+        except ValueError:
+            last = None
+        if last is not None and since is not None and last.source == since:
+            index = last.update(db, ninja_ids)
+    if index is None:
+        index = SimilarityIndex.build(db)
+    index.source = source_digest(db)
+    index.save(root)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Find the competitors who run most like a competitor.')
+    parser.add_argument('root', type=pathlib.Path, help='the index directory')
+    parser.add_argument('name', help='the competitor, e.g. "Kevin Bull"')
+    parser.add_argument(
+        '-k', type=int, default=5, help='the number of competitors to list')
+    parser.add_argument(
+        '--obstacle',
+        type=int,
+        help='only list competitors on this obstacle\'s leaderboard')
+    parser.add_argument(
+        '--database', help='the database URL; defaults to $DATABASE_URL')
+    args = parser.parse_args()
+
+    db = connect(args.database)
+    index = load(args.root)
+    first, last = args.name.split(' ', 1)
+    found = db.query_file('ninja_by_name.sql', f=first, l=last)
+    if not found:
+        parser.error('No competitor named {0}'.format(args.name))
+    among = None
+    if args.obstacle is not None:
+        among = [
+            r.ninja_id
+            for r in db.query_file('leaderboard.sql', obs_id=args.obstacle)
+        ]
+    for ninja_id, distance in index.neighbors(found[0].ninja_id, args.k,
+                                              among):
+        ninja = db.query(
+            'SELECT first_name, last_name FROM Ninja WHERE ninja_id = :id',
+            id=ninja_id)[0]
+        print('{0:6.3f}  {1} {2}'.format(distance, ninja.first_name,
+                                         ninja.last_name))
+    db.close()
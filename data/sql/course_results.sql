@@ -0,0 +1,14 @@
+/**
+ * Get every course result along with its course, in insertion order.
+ */
+SELECT
+    CourseResult.ninja_id,
+    CourseResult.finish_point,
+    CourseResult.completed,
+    Course.season,
+    Course.category,
+    Course.course_id,
+    Course.size
+FROM CourseResult, Course
+WHERE CourseResult.course_id=Course.course_id
+ORDER BY CourseResult.result_id;
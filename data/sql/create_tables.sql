@@ -84,3 +84,57 @@ CREATE TABLE CareerSummary (
     stages integer NOT NULL,
     ninja_id integer references Ninja(ninja_id)
 );
+
+/**
+ * CsvManifest records the content hash of the CSV file that each course was
+ * loaded from, which lets incremental builds skip unchanged files.
+ */
+CREATE TABLE CsvManifest (
+    path text PRIMARY KEY,
+    digest text NOT NULL,
+    course_id integer references Course(course_id)
+);
+
+/**
+ * ObstacleLeaderboard materializes each obstacle's leaderboard (see
+ * leaders.sql): everyone who completed it, placed by their fastest time
+ * (duration plus transition). Tied competitors share a place.
+ */
+CREATE TABLE ObstacleLeaderboard (
+    obstacle_id integer references Obstacle(obstacle_id),
+    ninja_id integer references Ninja(ninja_id),
+    place integer NOT NULL,
+    time decimal,
+    PRIMARY KEY (obstacle_id, ninja_id)
+);
+
+/**
+ * ObstacleStats summarizes the recorded attempts on each obstacle, with the
+ * median and 90th percentile split of the completed ones.
+ */
+CREATE TABLE ObstacleStats (
+    obstacle_id integer PRIMARY KEY references Obstacle(obstacle_id),
+    attempts integer NOT NULL,
+    completions integer NOT NULL,
+    p50_split decimal,
+    p90_split decimal
+);
+
+/**
+ * CourseStats summarizes the runs on each course: the distribution of finish
+ * points over every run and of times over the completed ones.
+ *
+ * A course's statistics (and its obstacles' ObstacleStats and
+ * ObstacleLeaderboard rows) are computed once its results are in and are
+ * deleted along with it, so courses without a CourseStats row are the ones
+ * to refresh.
+ */
+CREATE TABLE CourseStats (
+    course_id integer PRIMARY KEY references Course(course_id),
+    attempts integer NOT NULL,
+    completions integer NOT NULL,
+    p50_finish decimal,
+    p90_finish decimal,
+    p50_time decimal,
+    p90_time decimal
+);
@@ -0,0 +1,18 @@
+/**
+ * Deletes a course along with its obstacles, results, statistics and manifest
+ * entry.
+ */
+DELETE FROM ObstacleLeaderboard WHERE obstacle_id IN (
+    SELECT obstacle_id FROM Obstacle WHERE course_id=:id
+);
+DELETE FROM ObstacleStats WHERE obstacle_id IN (
+    SELECT obstacle_id FROM Obstacle WHERE course_id=:id
+);
+DELETE FROM CourseStats WHERE course_id=:id;
+DELETE FROM ObstacleResult WHERE obstacle_id IN (
+    SELECT obstacle_id FROM Obstacle WHERE course_id=:id
+);
+DELETE FROM CourseResult WHERE course_id=:id;
+DELETE FROM Obstacle WHERE course_id=:id;
+DELETE FROM CsvManifest WHERE course_id=:id;
+DELETE FROM Course WHERE course_id=:id;
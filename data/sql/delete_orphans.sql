@@ -0,0 +1,12 @@
+/**
+ * Deletes competitors (and their summaries) who no longer have any results.
+ */
+DELETE FROM CareerSummary WHERE ninja_id IN (
+    SELECT ninja_id FROM Ninja WHERE NOT EXISTS (
+        SELECT 1 FROM CourseResult WHERE CourseResult.ninja_id=Ninja.ninja_id
+    )
+);
+DELETE FROM Ninja WHERE NOT EXISTS (
+    SELECT 1 FROM CourseResult WHERE CourseResult.ninja_id=Ninja.ninja_id
+)
+RETURNING ninja_id;
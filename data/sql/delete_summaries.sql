@@ -0,0 +1,4 @@
+/**
+ * Deletes the CareerSummary rows of the competitors with the given IDs.
+ */
+DELETE FROM CareerSummary WHERE ninja_id = ANY(:ids)
@@ -0,0 +1,7 @@
+/**
+ * Drops every table (and anything that depends on them).
+ */
+DROP TABLE IF EXISTS
+    Ninja, Course, Obstacle, ObstacleResult, CourseResult, CareerSummary,
+    CsvManifest, ObstacleLeaderboard, ObstacleStats, CourseStats
+CASCADE;
@@ -0,0 +1,13 @@
+/**
+ * Get the course results of the competitors with the given IDs, along with
+ * each course's category and size.
+ */
+SELECT
+    CourseResult.ninja_id,
+    Course.category,
+    CourseResult.finish_point,
+    CourseResult.completed,
+    Course.size
+FROM CourseResult
+JOIN Course ON (CourseResult.course_id=Course.course_id)
+WHERE CourseResult.ninja_id = ANY(:ids)
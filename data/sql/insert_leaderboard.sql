@@ -0,0 +1,23 @@
+/**
+ * Fills in the ObstacleLeaderboard of every obstacle on a course whose
+ * statistics haven't been computed yet, ranked as in placings.sql.
+ */
+INSERT INTO ObstacleLeaderboard (obstacle_id, ninja_id, place, time)
+SELECT obstacle_id, ninja_id, MIN(place), MIN(time)
+FROM (
+    SELECT
+        ObstacleResult.obstacle_id,
+        ObstacleResult.ninja_id,
+        RANK() OVER (
+            PARTITION BY ObstacleResult.obstacle_id
+            ORDER BY duration + transition ASC
+        ) AS place,
+        duration + transition AS time
+    FROM ObstacleResult
+    JOIN Obstacle ON (ObstacleResult.obstacle_id=Obstacle.obstacle_id)
+    WHERE completed=true AND transition<30.0 AND NOT EXISTS (
+        SELECT 1 FROM CourseStats
+        WHERE CourseStats.course_id=Obstacle.course_id
+    )
+) AS leaders
+GROUP BY obstacle_id, ninja_id
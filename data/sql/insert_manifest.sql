@@ -0,0 +1,6 @@
+/**
+ * Inserts a row into the CsvManifest table.
+ */
+INSERT INTO CsvManifest(path, digest, course_id)
+VALUES (:file, :digest, :id)
+RETURNING path;
@@ -0,0 +1,6 @@
+/**
+ * Get the given obstacle's leaderboard, in order.
+ */
+SELECT ninja_id, place, time FROM ObstacleLeaderboard
+WHERE obstacle_id=:obs_id
+ORDER BY place, ninja_id
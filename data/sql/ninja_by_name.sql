@@ -0,0 +1,4 @@
+/**
+ * Get the competitors with the given name.
+ */
+SELECT ninja_id FROM Ninja WHERE first_name=:f AND last_name=:l
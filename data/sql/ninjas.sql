@@ -0,0 +1,19 @@
+/**
+ * Get every competitor along with the season of their first result, which is
+ * the season that their recorded age is from.
+ */
+SELECT
+    ninja_id,
+    first_name,
+    last_name,
+    sex,
+    age,
+    (
+        SELECT Course.season FROM CourseResult
+        JOIN Course ON (CourseResult.course_id=Course.course_id)
+        WHERE CourseResult.ninja_id=Ninja.ninja_id
+        ORDER BY CourseResult.result_id ASC
+        LIMIT 1
+    ) AS season
+FROM Ninja
+ORDER BY ninja_id
@@ -0,0 +1,4 @@
+/**
+ * Get all competitors with a result on the given course.
+ */
+SELECT DISTINCT ninja_id FROM CourseResult WHERE course_id=:id
@@ -0,0 +1,4 @@
+/**
+ * Get the competitors with the given IDs that are still in the Ninja table.
+ */
+SELECT ninja_id FROM Ninja WHERE ninja_id = ANY(:ids) ORDER BY ninja_id
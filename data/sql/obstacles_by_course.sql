@@ -1,4 +1,4 @@
 /**
- * Get all obstacles for the given course.
+ * Get all obstacles and the course they belong to.
  */
-SELECT obstacle_id FROM Obstacle WHERE course_id=:id
+SELECT obstacle_id, course_id FROM Obstacle ORDER BY course_id, obstacle_id
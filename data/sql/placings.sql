@@ -0,0 +1,19 @@
+/**
+ * Get every competitor's place on each obstacle's leaderboard, where the
+ * leaderboard is the ordering returned by leaders.sql.
+ *
+ * Tied competitors share a place and a competitor with more than one result
+ * on an obstacle is placed by their best one.
+ */
+SELECT obstacle_id, ninja_id, MIN(place) AS place
+FROM (
+    SELECT
+        obstacle_id,
+        ninja_id,
+        RANK() OVER (
+            PARTITION BY obstacle_id ORDER BY duration + transition ASC
+        ) AS place
+    FROM ObstacleResult
+    WHERE completed=true AND transition<30.0
+) AS leaders
+GROUP BY obstacle_id, ninja_id
@@ -0,0 +1,18 @@
+/**
+ * Get the course results of the competitors with the given IDs (a JSON
+ * array), along with each course.
+ */
+SELECT
+    CourseResult.ninja_id,
+    Course.course_id,
+    Course.city,
+    Course.category,
+    Course.season,
+    Course.size,
+    CourseResult.duration,
+    CourseResult.finish_point,
+    CourseResult.completed
+FROM CourseResult
+JOIN Course ON (CourseResult.course_id=Course.course_id)
+WHERE CourseResult.ninja_id IN (SELECT value FROM json_each(:ids))
+ORDER BY CourseResult.ninja_id, CourseResult.result_id
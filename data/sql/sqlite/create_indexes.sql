@@ -0,0 +1,46 @@
+/**
+ * The SQLite version of ../create_indexes.sql, whose leaderboard index
+ * matches sqlite/leaders.sql's ordering.
+ *
+ * Indexes for the lookups made by the ingest and the Ninja Reference front
+ * end. They're built after the tables have been bulk loaded, which is much
+ * faster than keeping them up to date row by row. `plans.py` checks that the
+ * queries that need them can use them.
+ */
+CREATE INDEX IF NOT EXISTS ninja_name_idx ON Ninja (first_name, last_name);
+
+CREATE INDEX IF NOT EXISTS obstacle_course_title_idx
+    ON Obstacle (course_id, title);
+
+CREATE INDEX IF NOT EXISTS obstacle_result_obstacle_idx
+    ON ObstacleResult (obstacle_id);
+
+CREATE INDEX IF NOT EXISTS obstacle_result_ninja_idx
+    ON ObstacleResult (ninja_id);
+
+/**
+ * Also serves ninjas.sql's lookup of each competitor's first result.
+ */
+CREATE INDEX IF NOT EXISTS course_result_ninja_idx
+    ON CourseResult (ninja_id, result_id);
+
+CREATE INDEX IF NOT EXISTS course_result_course_idx
+    ON CourseResult (course_id);
+
+CREATE INDEX IF NOT EXISTS career_summary_ninja_idx
+    ON CareerSummary (ninja_id);
+
+/**
+ * The leaderboard of each obstacle (see leaders.sql), in order.
+ */
+CREATE INDEX IF NOT EXISTS obstacle_result_leaders_idx
+    ON ObstacleResult (obstacle_id, ROUND(duration + transition, 2))
+    WHERE completed=true AND transition<30.0;
+
+/**
+ * Serves leaderboard.sql's lookups of the materialized leaderboards.
+ */
+CREATE INDEX IF NOT EXISTS obstacle_leaderboard_place_idx
+    ON ObstacleLeaderboard (obstacle_id, place, ninja_id);
+
+ANALYZE;
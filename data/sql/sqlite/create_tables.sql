@@ -0,0 +1,148 @@
+/**
+ * The SQLite version of ../create_tables.sql.
+ *
+ * An `integer PRIMARY KEY` is an alias for the rowid, so, like a serial
+ * column, it's assigned the next ID when it isn't given one. Decimals are
+ * stored as REAL and booleans as 0 or 1.
+ */
+
+/**
+ * Ninja represents an individual ANW competitor.
+ */
+CREATE TABLE Ninja (
+    ninja_id integer PRIMARY KEY,
+    first_name text NOT NULL,
+    last_name text NOT NULL,
+    sex char(1) NOT NULL,
+    age integer,
+    occupation text,
+    instagram text,
+    twitter text
+);
+
+/**
+ * Course represents an individual ANW course.
+ *
+ * `category` is one of "Qualifying", "Finals", or a stage number (1 - 4).
+ *
+ * `size` can be NULL because we don't know it until we've counted the number
+ * of obstacles.
+ */
+CREATE TABLE Course (
+    course_id integer PRIMARY KEY,
+    city text NOT NULL,
+    category text NOT NULL,
+    season integer NOT NULL,
+    size integer
+);
+
+/**
+ * Obstacle represents an individual ANW obstacle.
+ */
+CREATE TABLE Obstacle (
+    obstacle_id integer PRIMARY KEY,
+    title text NOT NULL,
+    course_id integer references Course(course_id)
+);
+
+
+/**
+ * ObstacleResult represents an individual ANW obstacle result.
+ *
+ * `transition` is the amount of time used (i.e., rest) prior to starting the
+ * obstacle.
+ */
+CREATE TABLE ObstacleResult (
+    result_id integer PRIMARY KEY,
+    transition decimal NOT NULL,
+    duration decimal,
+    completed boolean NOT NULL,
+    obstacle_id integer references Obstacle(obstacle_id),
+    ninja_id integer references Ninja(ninja_id)
+);
+
+/**
+ * CourseResult represents an individual ANW course result.
+ */
+CREATE TABLE CourseResult (
+    result_id integer PRIMARY KEY,
+    duration decimal,
+    finish_point integer NOT NULL,
+    completed boolean NOT NULL,
+    course_id integer references Course(course_id),
+    ninja_id integer references Ninja(ninja_id)
+);
+
+/**
+ * CareerSummary provides a high-level view of a competitor's career, including
+ * the number of courses completed (qualifying, finals, and Mount Midoriyama
+ * stages), the number of seasons competed, their best finish, and their Ninja
+ * Rating.
+ */
+CREATE TABLE CareerSummary (
+    summary_id integer PRIMARY KEY,
+    best_finish text NOT NULL,
+    speed decimal NOT NULL,
+    success decimal NOT NULL,
+    consistency decimal NOT NULL,
+    rating decimal NOT NULL,
+    seasons integer NOT NULL,
+    qualifying integer NOT NULL,
+    finals integer NOT NULL,
+    stages integer NOT NULL,
+    ninja_id integer references Ninja(ninja_id)
+);
+
+/**
+ * CsvManifest records the content hash of the CSV file that each course was
+ * loaded from, which lets incremental builds skip unchanged files.
+ */
+CREATE TABLE CsvManifest (
+    path text PRIMARY KEY,
+    digest text NOT NULL,
+    course_id integer references Course(course_id)
+);
+
+/**
+ * ObstacleLeaderboard materializes each obstacle's leaderboard (see
+ * leaders.sql): everyone who completed it, placed by their fastest time
+ * (duration plus transition). Tied competitors share a place.
+ */
+CREATE TABLE ObstacleLeaderboard (
+    obstacle_id integer references Obstacle(obstacle_id),
+    ninja_id integer references Ninja(ninja_id),
+    place integer NOT NULL,
+    time decimal,
+    PRIMARY KEY (obstacle_id, ninja_id)
+);
+
+/**
+ * ObstacleStats summarizes the recorded attempts on each obstacle, with the
+ * median and 90th percentile split of the completed ones.
+ */
+CREATE TABLE ObstacleStats (
+    obstacle_id integer PRIMARY KEY references Obstacle(obstacle_id),
+    attempts integer NOT NULL,
+    completions integer NOT NULL,
+    p50_split decimal,
+    p90_split decimal
+);
+
+/**
+ * CourseStats summarizes the runs on each course: the distribution of finish
+ * points over every run and of times over the completed ones.
+ *
+ * A course's statistics (and its obstacles' ObstacleStats and
+ * ObstacleLeaderboard rows) are computed once its results are in and are
+ * deleted along with it, so courses without a CourseStats row are the ones
+ * to refresh.
+ */
+CREATE TABLE CourseStats (
+    course_id integer PRIMARY KEY references Course(course_id),
+    attempts integer NOT NULL,
+    completions integer NOT NULL,
+    p50_finish decimal,
+    p90_finish decimal,
+    p50_time decimal,
+    p90_time decimal
+);
@@ -0,0 +1,6 @@
+/**
+ * Deletes the CareerSummary rows of the competitors with the given IDs (a JSON
+ * array).
+ */
+DELETE FROM CareerSummary
+WHERE ninja_id IN (SELECT value FROM json_each(:ids))
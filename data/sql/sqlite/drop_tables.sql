@@ -0,0 +1,14 @@
+/**
+ * Drops every table. SQLite has no CASCADE, so tables are dropped after the
+ * tables that reference them.
+ */
+DROP TABLE IF EXISTS CourseStats;
+DROP TABLE IF EXISTS ObstacleStats;
+DROP TABLE IF EXISTS ObstacleLeaderboard;
+DROP TABLE IF EXISTS CsvManifest;
+DROP TABLE IF EXISTS CareerSummary;
+DROP TABLE IF EXISTS CourseResult;
+DROP TABLE IF EXISTS ObstacleResult;
+DROP TABLE IF EXISTS Obstacle;
+DROP TABLE IF EXISTS Course;
+DROP TABLE IF EXISTS Ninja;
@@ -0,0 +1,9 @@
+/**
+ * The SQLite version of ../leaders.sql.
+ *
+ * Times are stored as REAL, so their sums are rounded back to hundredths of
+ * a second to keep ties (and the index's ordering) the same as with decimals.
+ */
+SELECT ninja_id FROM ObstacleResult
+WHERE completed=true AND transition<30.0 AND ObstacleResult.obstacle_id=:obs_id
+ORDER BY ROUND(duration + transition, 2) ASC
@@ -0,0 +1,7 @@
+/**
+ * Get the competitors with the given IDs (a JSON array) that are still in the
+ * Ninja table.
+ */
+SELECT ninja_id FROM Ninja
+WHERE ninja_id IN (SELECT value FROM json_each(:ids))
+ORDER BY ninja_id
@@ -0,0 +1,24 @@
+/**
+ * Get the obstacle results of the competitors with the given IDs (a JSON
+ * array), along with each obstacle's title and course and their place on its
+ * leaderboard (if they're on it).
+ */
+SELECT
+    ObstacleResult.ninja_id,
+    Obstacle.course_id,
+    Obstacle.obstacle_id,
+    Obstacle.title,
+    ObstacleResult.transition,
+    ObstacleResult.duration,
+    ObstacleResult.completed,
+    ObstacleLeaderboard.place,
+    ObstacleLeaderboard.time
+FROM ObstacleResult
+JOIN Obstacle ON (ObstacleResult.obstacle_id=Obstacle.obstacle_id)
+LEFT JOIN ObstacleLeaderboard ON (
+    ObstacleResult.obstacle_id=ObstacleLeaderboard.obstacle_id
+    AND ObstacleResult.ninja_id=ObstacleLeaderboard.ninja_id
+)
+WHERE ObstacleResult.ninja_id IN (SELECT value FROM json_each(:ids))
+ORDER BY ObstacleResult.ninja_id, Obstacle.obstacle_id,
+    ObstacleResult.result_id
@@ -0,0 +1,16 @@
+/**
+ * The SQLite version of ../placings.sql, which ranks rounded sums of times
+ * like leaders.sql does.
+ */
+SELECT obstacle_id, ninja_id, MIN(place) AS place
+FROM (
+    SELECT
+        obstacle_id,
+        ninja_id,
+        RANK() OVER (
+            PARTITION BY obstacle_id ORDER BY ROUND(duration + transition, 2)
+        ) AS place
+    FROM ObstacleResult
+    WHERE completed=true AND transition<30.0
+) AS leaders
+GROUP BY obstacle_id, ninja_id
@@ -0,0 +1,26 @@
+/**
+ * Get the competitors with the given IDs (a JSON array), along with their
+ * career summaries.
+ */
+SELECT
+    Ninja.ninja_id,
+    Ninja.first_name,
+    Ninja.last_name,
+    Ninja.sex,
+    Ninja.age,
+    Ninja.occupation,
+    Ninja.instagram,
+    Ninja.twitter,
+    CareerSummary.best_finish,
+    CareerSummary.speed,
+    CareerSummary.success,
+    CareerSummary.consistency,
+    CareerSummary.rating,
+    CareerSummary.seasons,
+    CareerSummary.qualifying,
+    CareerSummary.finals,
+    CareerSummary.stages
+FROM Ninja
+LEFT JOIN CareerSummary ON (Ninja.ninja_id=CareerSummary.ninja_id)
+WHERE Ninja.ninja_id IN (SELECT value FROM json_each(:ids))
+ORDER BY Ninja.ninja_id
@@ -0,0 +1,16 @@
+/**
+ * Get the obstacle results of the competitors with the given IDs (a JSON
+ * array), along with each course's category and each obstacle's median split.
+ */
+SELECT
+    ObstacleResult.ninja_id,
+    Course.category,
+    ObstacleResult.duration,
+    ObstacleResult.transition,
+    ObstacleResult.completed,
+    ObstacleStats.p50_split
+FROM ObstacleResult
+JOIN Obstacle ON (ObstacleResult.obstacle_id=Obstacle.obstacle_id)
+JOIN Course ON (Obstacle.course_id=Course.course_id)
+JOIN ObstacleStats ON (ObstacleResult.obstacle_id=ObstacleStats.obstacle_id)
+WHERE ObstacleResult.ninja_id IN (SELECT value FROM json_each(:ids))
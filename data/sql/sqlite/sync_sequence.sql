@@ -0,0 +1,5 @@
+/**
+ * SQLite assigns an `integer PRIMARY KEY` one more than the largest ID in the
+ * table, so there's no sequence to move.
+ */
+SELECT :value AS value
@@ -0,0 +1,6 @@
+/**
+ * Checks whether the given table has been created.
+ */
+SELECT EXISTS (
+    SELECT 1 FROM sqlite_master WHERE type='table' AND name=:table
+) AS present
@@ -0,0 +1,9 @@
+/**
+ * Get the course results on courses whose statistics haven't been computed
+ * yet.
+ */
+SELECT course_id, finish_point, duration, completed FROM CourseResult
+WHERE NOT EXISTS (
+    SELECT 1 FROM CourseStats
+    WHERE CourseStats.course_id=CourseResult.course_id
+)
@@ -0,0 +1,8 @@
+/**
+ * Get the courses whose statistics haven't been computed yet.
+ */
+SELECT course_id FROM Course
+WHERE NOT EXISTS (
+    SELECT 1 FROM CourseStats WHERE CourseStats.course_id=Course.course_id
+)
+ORDER BY course_id
@@ -0,0 +1,13 @@
+/**
+ * Get the obstacle results on courses whose statistics haven't been computed
+ * yet.
+ */
+SELECT
+    ObstacleResult.obstacle_id,
+    ObstacleResult.duration,
+    ObstacleResult.completed
+FROM ObstacleResult
+JOIN Obstacle ON (ObstacleResult.obstacle_id=Obstacle.obstacle_id)
+WHERE NOT EXISTS (
+    SELECT 1 FROM CourseStats WHERE CourseStats.course_id=Obstacle.course_id
+)
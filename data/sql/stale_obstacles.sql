@@ -0,0 +1,8 @@
+/**
+ * Get the obstacles on courses whose statistics haven't been computed yet.
+ */
+SELECT obstacle_id FROM Obstacle
+WHERE NOT EXISTS (
+    SELECT 1 FROM CourseStats WHERE CourseStats.course_id=Obstacle.course_id
+)
+ORDER BY obstacle_id
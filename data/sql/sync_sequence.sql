@@ -0,0 +1,4 @@
+/**
+ * Moves a table's serial sequence past IDs that were assigned client-side.
+ */
+SELECT setval(pg_get_serial_sequence(:table, :column), :value);
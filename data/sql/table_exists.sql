@@ -0,0 +1,4 @@
+/**
+ * Checks whether the given table has been created.
+ */
+SELECT to_regclass(:table) IS NOT NULL AS present
@@ -0,0 +1,154 @@
+"""stats.py
+
+Computes the per-obstacle and per-course statistics behind the ObstacleStats
+and CourseStats tables in one batched NumPy pass, like `rating.summarize`
+does for CareerSummary.
+
+Percentiles are linearly interpolated, which matches PostgreSQL's
+`percentile_cont`, and are None for groups without any values.
+"""
+import numpy as np
+
+# The percentiles stored for split and course times.
+PERCENTILES = (50, 90)
+
+
+def to_float(values):
+    """Convert database values (e.g., decimals) to floats, with NaN for NULLs.
+
+    Examples:
+        >>> to_float(['1.5', None, 2]).tolist()
+        [1.5, nan, 2.0]
+    """
+    return np.array([np.nan if v is None else float(v) for v in values],
+                    np.float64)
+
+
+def find(unique, lookup):
+    """Find each key in `lookup` in the sorted array `unique`.
+
+    Returns:
+        (np.ndarray, np.ndarray): (the index of each key, whether it was
+                                  found).
+
+    Examples:
+        >>> [a.tolist() for a in find(np.array([2, 4]), np.array([4, 3, 5]))]
+        [[1, 1, 2], [True, False, False]]
+    """
+    lookup = np.asarray(lookup)
+    idx = np.searchsorted(unique, lookup)
+    found = idx < len(unique)
+    found[found] = unique[idx[found]] == lookup[found]
+    return idx, found
+
+
+def group_percentiles(keys, values, lookup, q):
+    """Compute the `q`th percentile of `values` grouped by `keys` for each
+    key in `lookup`, ignoring NaNs.
+
+    Examples:
+        >>> group_percentiles(np.array([1, 2, 1, 1, 2]),
+        ...                   np.array([3.0, 7.0, 1.0, 2.0, np.nan]),
+        ...                   np.array([1, 2, 3]), 50)
+        [2.0, 7.0, None]
+        >>> group_percentiles(np.array([1, 1]), np.array([1.0, 2.0]),
+        ...                   np.array([1]), 90)
+        [1.9]
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, np.float64)
+    known = ~np.isnan(values)
+    keys, values = keys[known], values[known]
+
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    unique, start, count = np.unique(
+        keys, return_index=True, return_counts=True)
+
+    position = (count - 1) * q / 100.0
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    result = values[start + low] + (
+        values[start + high] - values[start + low]) * (position - low)
+
+    idx, found = find(unique, lookup)
+    return [
+        round(float(result[i]), 3) if f else None
+        for i, f in zip(idx.tolist(), found.tolist())
+    ]
+
+
+def counts(keys, lookup, where=None):
+    """Count the occurrences of each key in `lookup` among `keys` (where
+    `where` is True, if given).
+
+    Examples:
+        >>> counts(np.array([1, 3, 3]), np.array([1, 2, 3])).tolist()
+        [1, 0, 2]
+    """
+    keys = np.asarray(keys)
+    if where is not None:
+        keys = keys[np.asarray(where, bool)]
+    unique, count = np.unique(keys, return_counts=True)
+    idx, found = find(unique, lookup)
+    out = np.zeros(len(lookup), np.int64)
+    out[found] = count[idx[found]]
+    return out
+
+
+def obstacle_stats(obstacle_ids, results):
+    """Compute the ObstacleStats of every obstacle in `obstacle_ids`.
+
+    Args:
+        results (dict): Obstacle results as arrays: `obstacle_id`, `duration`
+                        and `completed`.
+
+    Returns:
+        dict: Lists aligned with `obstacle_ids`: `attempts`, `completions`
+              and the `p50_split` and `p90_split` of the completed attempts.
+    """
+    obstacle_ids = np.asarray(obstacle_ids, np.int64)
+    keys = np.asarray(results['obstacle_id'], np.int64)
+    completed = np.asarray(results['completed'], bool)
+    splits = to_float(results['duration'])
+    splits[~completed] = np.nan
+
+    stats = {
+        'attempts': counts(keys, obstacle_ids).tolist(),
+        'completions': counts(keys, obstacle_ids, completed).tolist()
+    }
+    for q in PERCENTILES:
+        stats['p{0}_split'.format(q)] = group_percentiles(
+            keys, splits, obstacle_ids, q)
+    return stats
+
+
+def course_stats(course_ids, results):
+    """Compute the CourseStats of every course in `course_ids`.
+
+    Args:
+        results (dict): Course results as arrays: `course_id`,
+                        `finish_point`, `duration` and `completed`.
+
+    Returns:
+        dict: Lists aligned with `course_ids`: `attempts`, `completions`,
+              the `p50_finish` and `p90_finish` finish point of every run and
+              the `p50_time` and `p90_time` of the completed runs.
+    """
+    course_ids = np.asarray(course_ids, np.int64)
+    keys = np.asarray(results['course_id'], np.int64)
+    completed = np.asarray(results['completed'], bool)
+    times = to_float(results['duration'])
+    times[~completed] = np.nan
+    finishes = to_float(results['finish_point'])
+
+    stats = {
+        'attempts': counts(keys, course_ids).tolist(),
+        'completions': counts(keys, course_ids, completed).tolist()
+    }
+    for q in PERCENTILES:
+        stats['p{0}_finish'.format(q)] = group_percentiles(
+            keys, finishes, course_ids, q)
+        stats['p{0}_time'.format(q)] = group_percentiles(
+            keys, times, course_ids, q)
+    return stats
@@ -1,6 +1,7 @@
-import difflib
+import collections
+import csv
 import doctest
-import os
+import hashlib
 import re
 import sys
 
@@ -15,6 +16,19 @@ TYPE_2_INT = {
     "Stage 4": 12
 }
 INT_2_TYPE = {v: k for k, v in TYPE_2_INT.items()}
+# The number of bytes read at a time when hashing a file.
+DIGEST_CHUNK = 1 << 16
+# A problem found in a CSV file: `level` is "error" or "warning", `row` is the
+# 1-based line number and `column` is an index into the file's headings (or
+# None if the problem concerns the whole row).
+Issue = collections.namedtuple('Issue', ['level', 'row', 'column', 'message'])
+# A competitor's parsed CSV row (see `parse_run`).
+Run = collections.namedtuple('Run', [
+    'name', 'shown', 'age', 'sex', 'obstacles', 'cleared', 'finish',
+    'completed', 'duration'
+])
+# A name with an optional "(PS)" or "(NS)" status.
+NAME_STATUS = re.compile(r'([^\(]+)(?:\((PS|NS)\))?')
 FINISH_2_NAME = {
     2.0: "Qualifying (0 obstacles)",
     2.1: "Qualifying (1 obstacle)",
@@ -64,13 +78,6 @@ FINISH_2_NAME = {
 }
 
 
-def query_file(db, query, **kwargs):
-    """Run the given query.
-    """
-    query_path = os.path.join('data', 'sql', query)
-    return db.query_file(query_path, **kwargs).all()
-
-
 def is_number(s):
     """Determine if the string `s` is a number.
 
@@ -110,31 +117,160 @@ def name_and_status(entry):
         >>> name_and_status('Luciano Acuna Jr.')
         ('Luciano Acuna Jr.', 'S')
     """
-    m = re.compile('([^\(]+)(?:\((PS|NS)\))?').match(entry)
+    m = NAME_STATUS.match(entry)
     return m.group(1).strip(" ").strip(), m.group(2) if m.group(2) else 'S'
 
 
-def check_spelling(name, seen):
-    """Look for names that could be mispellings of `name`.
+class CourseLayout(
+        collections.namedtuple('CourseLayout', [
+            'headings', 'obstacles', 'transitions', 'total', 'result',
+            'category'
+        ])):
+    """Where everything is in the rows of a course CSV file.
+
+    A layout is compiled once per file (see `compile`), so that rows can be
+    read by position rather than by looking at each cell's heading.
+
+    Attributes:
+        headings (Tuple[str]): The file's headings.
+        obstacles (Tuple[int]): The column of each obstacle's split, in
+                                course order.
+        transitions (Tuple[int]): The column of each Transition.
+        total (int): The column of the total time.
+        result (int): The column of the result ("Completed" or "Failed").
+        category (int): The course's `TYPE_2_INT` category, if known.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, headings, info=None):
+        """Work out the layout of a file with the given `headings`.
+
+        Args:
+            info (List[str]): The course's [city, category, season] (see
+                              `read_course`), for its `category`.
+
+        Examples:
+            >>> layout = CourseLayout.compile(
+            ...     ['Name', 'Age', 'Gender', 'Log Grip', 'Transition 1',
+            ...      'Warped Wall', 'Total', 'Result'], ['Stage', '1', '7'])
+            >>> layout.obstacles, layout.transitions, layout.total
+            ((3, 5), (4,), 6)
+            >>> INT_2_TYPE[layout.category]
+            'Stage 1'
+        """
+        transitions = tuple(i for i, heading in enumerate(headings)
+                            if heading.startswith('Transition'))
+        obstacles = tuple(i for i in range(3,
+                                           len(headings) - 2)
+                          if i not in transitions)
+        category = None
+        if info is not None:
+            category = TYPE_2_INT[course_values(info)[1]]
+        return cls(
+            tuple(headings), obstacles, transitions, len(headings) - 2,
+            len(headings) - 1, category)
+
+
+def read_rows(path):
+    """Read a CSV file one row at a time, starting with its headings.
+
+    The file is closed once every row has been read (or the generator is
+    closed).
+    """
+    with path.open(newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            yield row
+
+
+def file_digest(path):
+    """Hash the contents of the file at `path`.
+
+    Returns:
+        str: A hex digest that changes whenever the file does.
+    """
+    digest = hashlib.sha1()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stream_course(path):
+    """Like `read_course`, but the rows are read lazily.
+
+    Returns:
+        (List[str], List[str], Iterator[List[str]]): (course info, headings,
+                                                     rows).
+    """
+    course_info = path.parts[-1].strip('.csv').split('-')
+    rows = read_rows(path)
+    headings = next(rows)
+    return course_info, headings, rows
+
+
+def read_course(path):
+    """Read a course CSV file.
+
+    Returns:
+        (List[str], List[str], List[List[str]]): (course info, headings, rows),
+                                                 where the course info is
+                                                 [city, category, season].
+    """
+    course_info, headings, rows = stream_course(path)
+    return course_info, headings, list(rows)
+
+
+def course_values(info):
+    """Convert a CSV file's [city, category, season] into Course values.
 
     Examples:
-        >>> check_spelling('Jon Hoton', ['Jon Horton', 'Jon Hoton'])
-        ['Jon Horton']
-        >>> check_spelling('Jon Alexis Jr.', ['Jon Alexis Sr.'])
-        ['Jon Alexis Sr.']
+        >>> course_values(['Houston', 'Qualifying', '7'])
+        ('Houston', 'Qualifying', '7')
+        >>> course_values(['Stage', '2', '7'])
+        ('Las Vegas', 'Stage 2', '7')
+    """
+    city = info[0] if info[0] != 'Stage' else 'Las Vegas'
+    cat = info[1] if not is_number(info[1]) else 'Stage ' + info[1]
+    return city, cat, info[2]
+
+
+def obstacle_results(row, layout):
+    """Extract a competitor's obstacle results from a CSV row.
+
+    Results are listed in course order and stop at the first failed obstacle,
+    which is included with a duration of 0.
+
+    Args:
+        layout (CourseLayout): The layout of the row's file.
+
+    Returns:
+        List[(int, str, str, bool)]: (column, duration, transition, completed)
+                                     for each attempted obstacle, where
+                                     `column` indexes the obstacle's heading.
     """
-    matches = difflib.get_close_matches(name, seen, cutoff=0.9)
-    if matches and name in matches:
-        matches.remove(name)
-    return matches
+    results = []
+    for column in layout.obstacles:
+        time = row[column]
+        completed = is_number(time)
+        if not completed:
+            time = 0
+        # Every obstacle but the first follows a transition.
+        transition = row[column - 1] if (
+            column - 1) in layout.transitions else 0
+        results.append((column, time, transition, completed))
+        if not completed:
+            break
+    return results
 
 
-def finish_point(row, shown, results, obstacles, completed):
+def finish_point(row, shown, results, layout, completed):
     """Extract a failure point (i.e., which obstacle) from a given row.
 
     Args:
         shown (str): "S", "PS" or "NS".
         results (int): The number of completed obstacles.
+        layout (CourseLayout): The layout of the row's file.
         completed (bool): True if the course was completed and False otherwise.
 
     Returns:
@@ -145,11 +281,10 @@ def finish_point(row, shown, results, obstacles, completed):
         # If completed is True, the course was completed and thus there is no
         # fail point. If completed is False, then the fail point is 1 +
         # <# of completed obstacles>.
-        finish_point = obstacles if completed else results + 1
+        finish_point = len(layout.obstacles) if completed else results + 1
     else:
-        # Ignore the first 3 columns (Name, Age and Sex) and the last 2 (Total
-        # and Completed).
-        data = row[3:-2][0::2]
+        # Each obstacle's split.
+        data = [row[column] for column in layout.obstacles]
         if shown == "NS" and "F" in data:
             # The position of "F" indicates the failure point. E.g.,
             # [0, 1, 2, 'F', None, None] => 4th obstacle.
@@ -175,63 +310,141 @@ def finish_point(row, shown, results, obstacles, completed):
     return finish_point
 
 
+def parse_run(row, layout):
+    """Parse a competitor's CSV row once for everything that's derived from it.
+
+    Returns:
+        Run: The competitor's `name`, `shown` status, `age` (or None) and
+             `sex`, their `obstacles` (see `obstacle_results`; only shown runs
+             have any), the number of obstacles they `cleared`, their `finish`
+             point, whether they `completed` the course and their `duration`
+             (or None).
+
+    Examples:
+        >>> layout = CourseLayout.compile(
+        ...     ['Name', 'Age', 'Gender', 'Log Grip', 'Transition 1',
+        ...      'Warped Wall', 'Total', 'Result'])
+        >>> run = parse_run(['Jon Horton', '30', 'M', '1.5', '2', '', '3.5',
+        ...                  'Failed'], layout)
+        >>> run.obstacles, run.cleared, run.finish, run.completed
+        ([(3, '1.5', 0, True), (5, 0, '2', False)], 1, 2, False)
+        >>> parse_run(['Jon Horton (NS)', '', 'M', '', '', 'F', '', 'Failed'],
+        ...           layout).finish
+        2
+    """
+    name, shown = name_and_status(row[0])
+    obstacles = obstacle_results(row, layout) if shown == 'S' else []
+    cleared = sum(1 for _, _, _, done in obstacles if done)
+    completed = row[layout.result] == 'Completed'
+    finish = finish_point(row, shown, cleared, layout, completed)
+    return Run(name, shown, row[1].strip() or None, row[2].strip(), obstacles,
+               cleared, finish, completed, row[layout.total] or None)
+
+
+def row_errors(row, idx, layout):
+    """Find every problem in a single CSV row.
+
+    Args:
+        idx (int): The row's 1-based line number in its file.
+        layout (CourseLayout): The layout of the row's file.
+
+    Returns:
+        List[Issue]: The problems, in the order they appear in the row.
+    """
+    issues = []
+    expected_length = len(layout.headings)
+    _, shown = name_and_status(row[0]) if row else ('', 'S')
+
+    # Check for missing columns.
+    if len(row) != expected_length:
+        issues.append(
+            Issue('error', idx, None,
+                  'Length mismatch ({0} vs. expected {1})'.format(
+                      len(row), expected_length)))
+        return issues
+
+    # Check for transitions listed as failure points.
+    for j in layout.transitions:
+        if row[j] == 'F':
+            issues.append(Issue('error', idx, j, 'Invalid failure point'))
+
+    c = 3
+    t = 0
+    try:
+        while row[c] not in ('', 'F') and c < layout.total:
+            t += float(row[c])
+            c += 1
+    except ValueError:
+        issues.append(Issue('error', idx, c, 'Bad split ({0})'.format(row[c])))
+        return issues
+
+    # If a competitor failed the course, their last attempted obstacle
+    # should not have an associated duraton.
+    if row[layout.result] == 'Failed':
+        if (c - 1 > 2) and (c - 1) not in layout.transitions:
+            issues.append(
+                Issue('error', idx, c - 1,
+                      'Time for failed obstacle ({0})'.format(row[c - 1])))
+
+    # A competitor's splits should sum to their total time.
+    try:
+        if row[layout.total] and shown not in ('PS', 'NS'):
+            observed = round(float(row[layout.total]), 2)
+            expected = round(t, 2)
+            if observed != expected:
+                issues.append(
+                    Issue('error', idx, layout.total,
+                          '{0} != {1}'.format(t, observed)))
+    except ValueError:
+        issues.append(
+            Issue('error', idx, layout.total,
+                  'Bad finish time ({0})'.format(row[layout.total])))
+
+    return issues
+
+
+def find_errors(rows, headings):
+    """Find every problem in the CSV file with the given `rows` and `headings`.
+
+    Unlike `is_valid`, this keeps going after the first error. Possible
+    misspellings are checked across all files by `validate.py` instead. The
+    rows are checked together by `checks.course_errors`, which finds exactly
+    what `row_errors` would.
+
+    Returns:
+        List[Issue]: The problems, in the order they appear in the file.
+
+    Examples:
+        >>> headings = ['Name', 'Age', 'Gender', 'Log Grip', 'Transition 1',
+        ...             'Warped Wall', 'Total', 'Result']
+        >>> find_errors([['Jon Horton', '30', 'M', '1.5', '2', '3', '6.5',
+        ...               'Completed']], headings)
+        []
+        >>> rows = [['Jon Horton', '30', 'M', '1.5', 'F', '', '', 'Failed'],
+        ...         ['Jon Hoton', '30', 'M', '1', '1', '1', '2', 'Completed']]
+        >>> for issue in find_errors(rows, headings):
+        ...     print(issue.row, issue.column, issue.message)
+        2 4 Invalid failure point
+        2 3 Time for failed obstacle (1.5)
+        3 6 3.0 != 2.0
+    """
+    # `checks` applies `row_errors`' rules to every row at once (and imports
+    # this module).
+    from checks import course_errors
+    return course_errors(rows, CourseLayout.compile(headings))
+
+
 def is_valid(rows, headings):
     """Validate the CSV file with the given `rows` and `headings`
 
     Returns:
         bool: `True` if no errors were found and `False` otherwise.
     """
-    past_names = []
-    expected_length = len(headings)
-    for i, row in enumerate(rows):
-        idx = i + 2
-        name, shown = name_and_status(row[0])
-
-        # Check for missing columns.
-        if len(row) != expected_length:
-            print('Length mismatch ({0} vs. expected {1}) at row = {2}'.format(
-                len(row), expected_length, idx))
-            return False
-
-        # Check for transitions listed as failure points.
-        for j, value in enumerate(row):
-            if value == 'F' and headings[j].startswith('Transition'):
-                print('Invalid failure point at row = {0}'.format(idx))
-                return False
-
-        c = 3
-        t = 0
-        while row[c] not in ('', 'F') and c < expected_length - 2:
-            t += float(row[c])
-            c += 1
+    issues = find_errors(rows, headings)
+    for issue in issues:
+        print('{0} at row = {1}'.format(issue.message, issue.row))
+    return not any(issue.level == 'error' for issue in issues)
 
-        # If a competitor failed the course, their last attempted obstacle
-        # should not have an associated duraton.
-        if row[-1] == 'Failed':
-            if (c - 1 > 2) and not headings[c - 1].startswith('Transition'):
-                print('Time for failed obstacle at row = {0}'.format(idx))
-                print(row[c - 1])
-                return False
-
-        # A competitor's splits should sum to their total time.
-        try:
-            if row[-2] and shown not in ('PS', 'NS'):
-                observed = round(float(row[-2]), 2)
-                expected = round(t, 2)
-                if observed != expected:
-                    print('{0} != {1} at row = {2}'.format(t, observed, idx))
-                    return False
-        except ValueError:
-            print('Bad finish time ({0}) at row = {1}'.format(row[-2], idx))
-            return False
-
-        # Warn about potential typos.
-        matches = check_spelling(name, past_names)
-        if matches:
-            print("{} - {}, misspelled?".format(name, matches))
-        past_names.append(name)
-
-    return True
 
 if __name__ == '__main__':
     # Run tests
@@ -1,20 +1,450 @@
 #!/usr/bin/env python3
-import csv
+"""validate.py
+
+Checks the course CSV files in ``data/csv`` (see `checks.course_errors`) and
+looks for misspelled names across them.
+
+With ``--watch``, the files are checked once and then again whenever one of
+them is saved, until interrupted. Only the files whose contents changed are
+checked again (results are cached by content hash), and only the names that
+could be affected are looked up again (see `NameChecker`). Changes are
+noticed through inotify if `inotify_simple` is installed, and by polling
+the files' modification times otherwise. Rows appended by
+``timing/batch.py --append`` are picked up like any other edit.
+
+Example:
+    From the root of the repository ::
+
+        $ python data/validate.py --watch
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
 import pathlib
 import sys
+import time
 
-from util import is_valid
+from checks import CHECK_CHUNK, course_errors
+from names import NameIndex
+from util import (NAME_STATUS, CourseLayout, Issue, file_digest,
+                  name_and_status, read_rows)
+
+try:
+    import inotify_simple
+except ImportError:  # --watch polls without it.
+    inotify_simple = None
 
 CSV_DATA = pathlib.Path('data/csv')
-for f in CSV_DATA.glob('**/*.csv'):
-    base = f.parts[-1]
-    course_info = base.strip('.csv').split('-')
-    print('Reading {} ...'.format(base))
-    with f.open('rU') as csv_file:
-        reader = csv.reader(csv_file)
-        headings = next(reader)  # Skip the headings
-        rows = list(reader)
-        # Validate the CSV file
-        if not is_valid(rows, headings):
-            sys.exit(1)
-sys.exit(0)
+META_DATA = pathlib.Path('data/meta.json')
+# Name, Age, Gender, Total and Result.
+MIN_HEADINGS = 5
+
+
+def check_file(path):
+    """Validate the CSV file at `path`.
+
+    This is run in a worker process, so it only returns plain data. The rows
+    are read and checked `CHECK_CHUNK` at a time.
+
+    Returns:
+        (List[str], List[Issue], List[(int, str)]): (headings, problems found
+                                                    in the file, (row, name)
+                                                    for every competitor).
+    """
+    rows = read_rows(pathlib.Path(path))
+    headings = next(rows, [])
+    if len(headings) < MIN_HEADINGS:
+        rows.close()
+        return headings, [
+            Issue('error', 1, None,
+                  'Expected at least {0} headings (found {1})'.format(
+                      MIN_HEADINGS, len(headings)))
+        ], []
+    layout = CourseLayout.compile(headings)
+    issues = []
+    names = []
+    line = 2
+    while True:
+        chunk = list(itertools.islice(rows, CHECK_CHUNK))
+        if not chunk:
+            break
+        found = []
+        for i, row in enumerate(chunk):
+            if not row:
+                continue
+            elif NAME_STATUS.match(row[0]) is None:
+                found.append(Issue('error', line + i, 0,
+                                   'Bad name ({0})'.format(row[0])))
+            else:
+                names.append((line + i, name_and_status(row[0])[0]))
+        # Each row's name comes before its other problems.
+        found.extend(course_errors(chunk, layout, line))
+        issues.extend(sorted(found, key=lambda issue: issue.row))
+        line += len(chunk)
+    return headings, issues, names
+
+
+def check_file_safely(path):
+    """Like `check_file`, but a file that can't be read at all (e.g., while
+    an editor is saving it) is reported as an error instead of raising.
+    """
+    try:
+        return check_file(path)
+    except Exception as e:
+        return [], [
+            Issue('error', 1, None, 'Couldn\'t check the file ({0})'.format(
+                e))
+        ], []
+
+
+def check_names(entries):
+    """Look for names that could be misspellings of a name seen earlier, in
+    any file or in `meta.json`.
+
+    Args:
+        entries (List[(str, int, str)]): (file, row, name) for every
+                                         competitor, in order.
+
+    Returns:
+        List[(str, int, str)]: (file, row, message) for every possible
+                               misspelling.
+    """
+    with META_DATA.open() as meta:
+        index = NameIndex(json.load(meta))
+
+    warnings = []
+    seen = set()
+    for path, row, name in entries:
+        if name in seen:
+            continue
+        seen.add(name)
+        matches = index.matches(name)
+        if matches:
+            warnings.append(
+                (path, row, "{} - {}, misspelled?".format(name, matches)))
+        index.add(name)
+    return warnings
+
+
+class NameChecker(object):
+    """Finds the same possible misspellings as `check_names`, but remembers
+    every name's matches between calls.
+
+    Every name ever checked is kept in one index, and each name's matches
+    against all of them are cached. A name's warning only counts the matches
+    that came before it (or are in `meta.json`). Adding a name only clears
+    the cached matches of the names that it could match (see
+    `NameIndex.candidates`).
+
+    Args:
+        known (List[str]): The names in `meta.json`.
+
+    Examples:
+        >>> checker = NameChecker(['Jon Horton'])
+        >>> for warning in checker.check([('a.csv', 2, 'Jon Hoton'),
+        ...                               ('b.csv', 2, 'Kevin Bul'),
+        ...                               ('b.csv', 3, 'Kevin Bull')]):
+        ...     print(warning)
+        ('a.csv', 2, "Jon Hoton - ['Jon Horton'], misspelled?")
+        ('b.csv', 3, "Kevin Bull - ['Kevin Bul'], misspelled?")
+        >>> checker.check([('b.csv', 2, 'Kevin Bull')])
+        []
+    """
+
+    def __init__(self, known):
+        self.known = set(known)
+        self.index = NameIndex(known)
+        self._scored = {}
+
+    def _add(self, name):
+        if name in self.index:
+            return
+        for name_id in self.index.candidates(name):
+            self._scored.pop(self.index.name(name_id), None)
+        self.index.add(name)
+
+    def check(self, entries):
+        """Look for names that could be misspellings of a name seen earlier.
+
+        Args:
+            entries (List[(str, int, str)]): (file, row, name) for every
+                                             competitor, in order.
+
+        Returns:
+            List[(str, int, str)]: (file, row, message) for every possible
+                                   misspelling, like `check_names`.
+        """
+        first = {}
+        for i, (_, _, name) in enumerate(entries):
+            first.setdefault(name, i)
+        for name in first:
+            self._add(name)
+
+        warnings = []
+        for name, i in first.items():
+            if name not in self._scored:
+                self._scored[name] = self.index.scored_matches(name)
+            matches = [
+                other for _, other in self._scored[name]
+                if other in self.known or first.get(other, i) < i
+            ][:3]
+            if matches:
+                path, row, _ = entries[i]
+                warnings.append(
+                    (path, row, "{} - {}, misspelled?".format(name, matches)))
+        return warnings
+
+
+def check_files(paths, jobs=None, check=check_file):
+    """Run `check` (`check_file` or `check_file_safely`) on each of `paths`
+    across a pool of `jobs` processes (or in this process if `jobs` is 1).
+    """
+    if jobs == 1 or len(paths) < 2:
+        return [check(path) for path in paths]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(check, paths))
+
+
+def validate(paths, jobs=None):
+    """Validate the given CSV files across a pool of `jobs` processes.
+
+    Args:
+        paths (List[str]): The files to check.
+        jobs (int): The number of worker processes (defaults to the number of
+                    CPUs); 1 checks the files in this process.
+
+    Returns:
+        dict: A report with a `files` count, `errors` and `warnings` totals
+              and a list of `issues`, each of which has a `file`, `row`,
+              `column`, `heading`, `level` and `message`.
+    """
+    results = check_files(paths, jobs)
+    entries = [(path, row, name)
+               for path, (_, _, names) in zip(paths, results)
+               for row, name in names]
+    return make_report(paths, results, check_names(entries))
+
+
+def make_report(paths, results, warnings):
+    """Combine the results of `check_file` for each of `paths` with the
+    misspellings found across them into a report (see `validate`).
+    """
+    report = {'files': 0, 'errors': 0, 'warnings': 0, 'issues': []}
+    for path, (headings, issues, _) in zip(paths, results):
+        report['files'] += 1
+        for issue in issues:
+            report[issue.level + 's'] += 1
+            report['issues'].append({
+                'file': path,
+                'row': issue.row,
+                'column': issue.column,
+                'heading': None if issue.column is None else
+                headings[issue.column],
+                'level': issue.level,
+                'message': issue.message
+            })
+
+    for path, row, message in warnings:
+        report['warnings'] += 1
+        report['issues'].append({
+            'file': path,
+            'row': row,
+            'column': 0,
+            'heading': 'Name',
+            'level': 'warning',
+            'message': message
+        })
+
+    order = {path: i for i, path in enumerate(paths)}
+    report['issues'].sort(key=lambda i: (order[i['file']], i['row']))
+    return report
+
+
+def format_text(report):
+    """Format a report from `validate` for humans.
+    """
+    lines = []
+    for issue in report['issues']:
+        location = '{0}:{1}'.format(issue['file'], issue['row'])
+        if issue['heading'] is not None:
+            location += ' ({0})'.format(issue['heading'])
+        lines.append('{0}: {1}: {2}'.format(location, issue['level'],
+                                            issue['message']))
+    lines.append('Checked {0} files: {1} errors, {2} warnings.'.format(
+        report['files'], report['errors'], report['warnings']))
+    return '\n'.join(lines)
+
+
+def wait_for_changes(directories, interval):
+    """Block until something in `directories` might have changed.
+
+    This is a generator that yields once straight away and then after each
+    change: with inotify if it's available, and every `interval` seconds
+    otherwise.
+    """
+    if inotify_simple is None:
+        while True:
+            yield
+            time.sleep(interval)
+    flags = inotify_simple.flags
+    mask = (flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM
+            | flags.CREATE | flags.DELETE)
+    with inotify_simple.INotify() as inotify:
+        while True:
+            # New directories need watches of their own.
+            for directory in directories():
+                inotify.add_watch(str(directory), mask)
+            yield
+            # Wait a little for the rest of a save's events.
+            inotify.read(read_delay=20)
+
+
+def watch(paths=None, jobs=None, interval=0.25, as_json=False):
+    """Validate the CSV files, then revalidate them as they change.
+
+    Args:
+        paths (List[str]): The files to watch, or None for every file in
+                           `CSV_DATA` (including any that are added later).
+        interval (float): How often to check the files' modification times
+                          (without inotify), in seconds.
+        as_json (bool): Print each report as a line of JSON instead of
+                        listing the new issues.
+    """
+    stamps = {}  # path -> (mtime, size, digest)
+    results = {}  # digest -> check_file(path)
+    meta = None
+    names = None
+    shown = set()
+
+    def directories():
+        found = {META_DATA.parent}
+        if paths is None:
+            found.add(CSV_DATA)
+            found.update(d for d in CSV_DATA.glob('**/') if d.is_dir())
+        else:
+            found.update(pathlib.Path(p).parent for p in paths)
+        return sorted(found)
+
+    for _ in wait_for_changes(directories, interval):
+        start = time.perf_counter()
+        current = paths or [str(f) for f in sorted(CSV_DATA.glob('**/*.csv'))]
+        changed = []
+        for path in current:
+            try:
+                stat = os.stat(path)
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if stamps.get(path, (None, None))[:2] == stamp:
+                    continue
+                digest = file_digest(pathlib.Path(path))
+            except FileNotFoundError:
+                continue
+            if path not in stamps or stamps[path][2] != digest:
+                changed.append(path)
+            stamps[path] = stamp + (digest, )
+        current = [path for path in current if path in stamps]
+        removed = set(stamps) - set(current)
+        for path in removed:
+            del stamps[path]
+
+        try:
+            meta_digest = file_digest(META_DATA)
+            if meta_digest != meta:
+                meta = meta_digest
+                with META_DATA.open() as f:
+                    names = NameChecker(json.load(f))
+            elif not changed and not removed:
+                continue
+        except (OSError, ValueError) as e:
+            # Probably mid-save: the last good names are kept until it
+            # changes again.
+            if meta is not False:
+                sys.stderr.write('Couldn\'t read {0} ({1})\n'.format(
+                    META_DATA, e))
+            if isinstance(e, OSError):
+                meta = False
+            if names is None:
+                names = NameChecker([])
+            if not changed and not removed:
+                continue
+
+        todo = [p for p in changed if stamps[p][2] not in results]
+        for path, result in zip(todo,
+                                check_files(todo, jobs, check_file_safely)):
+            results[stamps[path][2]] = result
+        # Only the current version of each file is kept.
+        in_use = {stamps[path][2] for path in current}
+        for digest in set(results) - in_use:
+            del results[digest]
+
+        file_results = [results[stamps[path][2]] for path in current]
+        entries = [(path, row, name)
+                   for path, (_, _, found) in zip(current, file_results)
+                   for row, name in found]
+        report = make_report(current, file_results, names.check(entries))
+        if as_json:
+            print(json.dumps(report))
+        else:
+            keys = [(i['file'], i['row'], i['column'], i['message'])
+                    for i in report['issues']]
+            new = dict(report, issues=[
+                issue for issue, key in zip(report['issues'], keys)
+                if key not in shown or issue['file'] in changed
+            ])
+            shown = set(keys)
+            if len(changed) == len(current):
+                what = 'Watching {0} files'.format(len(current))
+            else:
+                what = ', '.join(changed + sorted(removed)) or META_DATA
+            print('[{0}] {1} ({2:.0f} ms)'.format(
+                time.strftime('%H:%M:%S'), what,
+                (time.perf_counter() - start) * 1000))
+            print(format_text(new))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Validate the CSV files in data/csv.')
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        help='the files to check (defaults to every file in data/csv)')
+    parser.add_argument(
+        '--format',
+        choices=['text', 'json'],
+        default='text',
+        help='the format of the report')
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='the number of worker processes')
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='keep checking the files as they change (until interrupted)')
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=0.25,
+        help=('how often --watch polls the files, in seconds, when inotify '
+              'isn\'t available (default: %(default)s)'))
+    args = parser.parse_args()
+
+    if args.watch:
+        try:
+            watch(args.paths or None, args.jobs, args.interval,
+                  args.format == 'json')
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    paths = args.paths or [str(f) for f in sorted(CSV_DATA.glob('**/*.csv'))]
+    report = validate(paths, args.jobs)
+    if args.format == 'json':
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_text(report))
+    sys.exit(1 if report['errors'] else 0)
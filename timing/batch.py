@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""batch.py
+
+Converts a log of clock readings for many runs into complete course CSV rows
+in one pass, instead of one ``split.py`` (or ``split_mt.py``) session per
+run.
+
+The log (a file or stdin) lists each run as a "Name,Age,Gender" line
+followed by the clock reading at each checkpoint, one per line: the end of
+the first obstacle, the end of the transition after it, the end of the
+second obstacle and so on. A run that ends with a line reading "F" failed
+the obstacle after its last checkpoint, so its last reading should end a
+transition (which is when the competitor fell). Blank lines and lines
+starting with "#" are ignored:
+
+    Kevin Bull,31,M
+    0:14.85
+    0:20.10
+    ...
+    Jo Jo Bynum,37,M
+    19.04
+    30.35
+    F
+
+Readings are "M:SS.ff" or "SS.ff". On count-up clocks (city courses) they're
+the time elapsed, while on Midoriyama's count-down clocks (``--countdown``)
+they're the time left of ``--limit``.
+
+Every row is checked with ``util.row_errors`` against the course's headings,
+so what's written passes ``validate.py``. Problems are reported on stderr
+(and make the exit status 1) and their runs are left out.
+
+Example:
+    From the root of the repository ::
+
+        $ python timing/batch.py log.txt --countdown --append \\
+            --course data/csv/season8/3/Stage-2-8.csv
+        Appended 12 rows to data/csv/season8/3/Stage-2-8.csv.
+"""
+import argparse
+import csv
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / 'data'))
+
+from util import CourseLayout, row_errors  # noqa: E402
+
+# The clock readings that a Midoriyama stage starts from, by default.
+DEFAULT_LIMIT = '2:30.00'
+
+
+def parse_clock(text):
+    """Convert a clock reading like "2:24.78" or "14.85" to hundredths of a
+    second.
+
+    Raises:
+        ValueError: If `text` isn't a reading.
+
+    Examples:
+        >>> parse_clock('2:24.78'), parse_clock('14.85'), parse_clock('0:07.5')
+        (14478, 1485, 750)
+        >>> parse_clock('1:75.00')
+        Traceback (most recent call last):
+          ...
+        ValueError: Bad clock reading (1:75.00)
+    """
+    minutes, colon, seconds = text.strip().rpartition(':')
+    whole, _, fraction = seconds.partition('.')
+    if not (whole.isdigit() and (minutes.isdigit() or not colon) and
+            (fraction.isdigit() or not fraction) and len(fraction) <= 2 and
+            (not colon or (len(whole) == 2 and int(whole) < 60))):
+        raise ValueError('Bad clock reading ({0})'.format(text.strip()))
+    total = int(whole) * 100 + int(fraction.ljust(2, '0') or 0)
+    if colon:
+        total += int(minutes) * 6000
+    return total
+
+
+def format_hundredths(value):
+    """Format hundredths of a second like the course CSV files do.
+
+    Examples:
+        >>> format_hundredths(1904), format_hundredths(1650)
+        ('19.04', '16.5')
+        >>> format_hundredths(2000), format_hundredths(0)
+        ('20', '0')
+    """
+    seconds, hundredths = divmod(value, 100)
+    if not hundredths:
+        return str(seconds)
+    return '{0}.{1:02d}'.format(seconds, hundredths).rstrip('0')
+
+
+def splits(readings, countdown=False, limit=None):
+    """Convert clock readings (in hundredths) to the time between each
+    checkpoint.
+
+    Raises:
+        ValueError: If the clock runs the wrong way.
+
+    Examples:
+        >>> splits([1485, 2010, 3000])
+        [1485, 525, 990]
+        >>> splits([14478, 13000], countdown=True, limit=15000)
+        [522, 1478]
+    """
+    out = []
+    last = limit if countdown else 0
+    for reading in readings:
+        split = last - reading if countdown else reading - last
+        if split < 0:
+            raise ValueError('The clock went {0} ({1})'.format(
+                'up' if countdown else 'down', format_clock(reading)))
+        out.append(split)
+        last = reading
+    return out
+
+
+def format_clock(value):
+    """Format hundredths of a second as a clock reading.
+
+    Examples:
+        >>> format_clock(14478)
+        '2:24.78'
+    """
+    minutes, hundredths = divmod(value, 6000)
+    return '{0}:{1:05.2f}'.format(minutes, hundredths / 100.0)
+
+
+def course_row(entrant, times, failed, size):
+    """Build a course CSV row.
+
+    Args:
+        entrant (List[str]): [name, age, gender].
+        times (List[int]): The splits (see `splits`), in hundredths.
+        failed (bool): True if the run ended in a failure.
+        size (int): The number of obstacles on the course.
+
+    Examples:
+        >>> course_row(['Jo Jo Bynum', '37', 'M'], [1904, 1131], True, 2)
+        ['Jo Jo Bynum', '37', 'M', '19.04', '11.31', '', '30.35', 'Failed']
+    """
+    cells = [format_hundredths(t) for t in times]
+    cells += [''] * (2 * size - 1 - len(cells))
+    return entrant + cells + [
+        format_hundredths(sum(times)), 'Failed' if failed else 'Completed'
+    ]
+
+
+def read_runs(lines):
+    """Group a log's lines into runs.
+
+    Yields:
+        (int, List[str], List[str], bool): (the line number of the run's
+            "Name,Age,Gender" line, its fields, its readings, whether it
+            ended with "F").
+
+    Examples:
+        >>> [r[1:] for r in read_runs(['A B,30,M', '1.00', '', 'F', 'C D,,F'])]
+        [(['A B', '30', 'M'], ['1.00'], True), (['C D', '', 'F'], [], False)]
+    """
+    run = None
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if run is not None and line == 'F':
+            run[3] = True
+        elif run is not None and not run[3] and line[0].isdigit():
+            run[2].append(line)
+        else:
+            if run is not None:
+                yield tuple(run)
+            run = [i, next(csv.reader([line])), [], False]
+    if run is not None:
+        yield tuple(run)
+
+
+def convert(lines, headings, countdown=False, limit=None):
+    """Convert a log of clock readings to course CSV rows.
+
+    Args:
+        headings (List[str]): The course's CSV headings.
+
+    Yields:
+        (int, List[str], List[str]): (the line number of the run in the log,
+            its CSV row, the problems with it).
+    """
+    layout = CourseLayout.compile(headings)
+    size = len(layout.obstacles)
+    for line, entrant, readings, failed in read_runs(lines):
+        try:
+            if len(entrant) != 3:
+                raise ValueError(
+                    'Expected "Name,Age,Gender" ({0})'.format(','.join(
+                        entrant)))
+            times = splits([parse_clock(r) for r in readings], countdown,
+                           limit)
+            if len(times) > 2 * size - 1:
+                raise ValueError('{0} readings for {1} obstacles'.format(
+                    len(times), size))
+            if not failed and len(times) != 2 * size - 1:
+                raise ValueError('Unfinished run without an "F"')
+        except ValueError as e:
+            yield line, None, [str(e)]
+            continue
+        row = course_row(entrant, times, failed, size)
+        yield line, row, [
+            issue.message for issue in row_errors(row, line, layout)
+            if issue.level == 'error'
+        ]
+
+
+def course_headings(path=None, obstacles=None):
+    """Get the headings of the course CSV file at `path`, or make up
+    headings for a course with `obstacles` obstacles.
+    """
+    if path is not None:
+        with path.open(newline='') as f:
+            return next(csv.reader(f))
+    headings = ['Name', 'Age', 'Gender']
+    for i in range(1, obstacles + 1):
+        if i > 1:
+            headings.append('Transition {0}'.format(i - 1))
+        headings.append('Obstacle {0}'.format(i))
+    return headings + ['Total', 'Result']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert a log of clock readings to course CSV rows.')
+    parser.add_argument(
+        'log',
+        nargs='?',
+        type=pathlib.Path,
+        help='the log of clock readings (defaults to stdin)')
+    course = parser.add_mutually_exclusive_group(required=True)
+    course.add_argument(
+        '--course',
+        type=pathlib.Path,
+        help='the course CSV file whose headings the rows should match')
+    course.add_argument(
+        '--obstacles',
+        type=int,
+        help='the number of obstacles on the course (without --course)')
+    parser.add_argument(
+        '--countdown',
+        action='store_true',
+        help='the clock counts down from --limit (Mount Midoriyama)')
+    parser.add_argument(
+        '--limit',
+        default=DEFAULT_LIMIT,
+        help='the time limit of a count-down clock (default: %(default)s)')
+    parser.add_argument(
+        '--append',
+        action='store_true',
+        help=('append the rows to --course (only if every run converts '
+              'cleanly) instead of printing them'))
+    args = parser.parse_args()
+    if args.append and not args.course:
+        parser.error('--append needs --course')
+
+    try:
+        limit = parse_clock(args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+    headings = course_headings(args.course, args.obstacles)
+    log = args.log.open() if args.log else sys.stdin
+    name = str(args.log) if args.log else '<stdin>'
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    rows = []
+    errors = 0
+    with log:
+        for line, row, problems in convert(log, headings, args.countdown,
+                                           limit):
+            for problem in problems:
+                sys.stderr.write('{0}:{1}: {2}\n'.format(name, line, problem))
+            if problems:
+                errors += 1
+            elif args.append:
+                rows.append(row)
+            else:
+                out.writerow(row)
+
+    if args.append and not errors:
+        with args.course.open('r+', newline='') as f:
+            text = f.read()
+            if text and not text.endswith('\n'):
+                f.write('\n')
+            csv.writer(f, lineterminator='\n').writerows(rows)
+        print('Appended {0} rows to {1}.'.format(len(rows), args.course))
+    sys.exit(1 if errors else 0)